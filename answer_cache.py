@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import threading
+import yaml
+from dotenv import load_dotenv
+from langchain_community.vectorstores import TiDBVectorStore
+from sqlalchemy import text
+from core.prediction_cache import model_artifact_hash
+from core.registry import registry
+from query_engine.embedding_cache import get_cached_embeddings
+from query_engine.engine_registry import get_engine, shared_engine_args
+from query_engine.local_ann import normalize_question
+from query_engine.question_templates import extract_literals
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+with open('llm_configs.yml', 'r') as f:
+    llm_config = yaml.safe_load(f)
+with open('conf_telchurn.yml', 'r') as f:
+    model_config = yaml.load(f, Loader=yaml.FullLoader)
+
+tidb_connection_string = os.getenv('TIDB_CONNECTION_URL')
+google_api_key = os.getenv('GOOGLE_API_KEY')
+
+SERVE, WARN, PASS = 'serve', 'warn', 'pass'
+
+
+def same_literals(question, cached_question):
+    """True when both questions carry the same literals (ids, amounts, dates, quoted values), in order."""
+    literals = [literal.lower() for literal in extract_literals(question)[1]]
+    return literals == [literal.lower() for literal in extract_literals(cached_question)[1]]
+
+
+def is_cacheable(answer, finish_reason=None, tool_failed=False):
+    """
+    False for empty answers, answers cut short (finish_reason other than STOP) and
+    answers built on a tool that reported an error (toolbox.tool_error).
+    """
+    if tool_failed or not answer or not answer.strip():
+        return False
+    return finish_reason is None or getattr(finish_reason, 'name', finish_reason) == 'STOP'
+
+
+class AnswerCache:
+    """
+    Semantic cache of agent answers, stored in a TiDB vector table.
+
+    Every entry records the model artifact hash, the Chat2Data data summary job id
+    and an expiry time. Lookups only consider entries built with the current model
+    and data summary, so retraining or a regenerated summary invalidates the cache
+    without any cleanup; expired entries are dropped when they are hit. The distance
+    to the nearest entry picks a tier: SERVE the answer, serve it with a WARNing, or
+    PASS the question on to the agent.
+
+    Embeddings barely separate questions that differ only in a literal ("customer
+    3334558" vs "customer 3334559"), so an entry whose literals differ from the
+    question's is never used, and only the same question (case and whitespace
+    aside) is SERVEd regardless of distance.
+    """
+
+    def __init__(self, table_name, model_hash, data_version, ttl_seconds=24 * 3600,
+                 serve_distance=0.05, warn_distance=0.16):
+        """
+        Parameters
+        ----------
+        table_name : str
+            Vector table holding the cached answers.
+        model_hash : str
+            Hash of the model artifacts the answers were produced with.
+        data_version : callable
+            Returns the current data summary job id.
+        ttl_seconds : int
+            Age after which an entry is no longer served.
+        serve_distance, warn_distance : float
+            Cosine distance limits of the SERVE and WARN tiers.
+        """
+        self.table_name = table_name
+        self.model_hash = model_hash
+        self.data_version = data_version
+        self.ttl_seconds = ttl_seconds
+        self.serve_distance = serve_distance
+        self.warn_distance = warn_distance
+        self.engine = get_engine(tidb_connection_string)
+        self.store = TiDBVectorStore(
+            embedding_function=get_cached_embeddings(llm_config['embedding_model'], google_api_key, caller='answer_cache'),
+            connection_string=tidb_connection_string,
+            table_name=table_name,
+            distance_strategy="cosine",
+            engine_args=shared_engine_args(tidb_connection_string),
+        )
+        self.counts = {SERVE: 0, WARN: 0, PASS: 0, 'expired': 0}
+        self._pending_writes = {}     # question -> writer thread not finished yet
+        self._lock = threading.Lock()
+
+    def _count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def lookup(self, question):
+        """
+        Returns (tier, entry). entry is a dict with question, answer, distance and
+        created_at, or None when the tier is PASS.
+        """
+        try:
+            results = self.store.similarity_search_with_score(
+                question, k=1, filter={"model_hash": self.model_hash, "data_summary_job_id": self.data_version()})
+        except Exception as e:
+            # Includes the table not existing before the first answer is cached
+            logger.warning(f"Answer cache lookup failed: {str(e)}")
+            results = []
+        if not results:
+            self._count(PASS)
+            return PASS, None
+
+        doc, distance = results[0]
+        if time.time() > doc.metadata.get("expires_at", 0):
+            self._count('expired')
+            self._count(PASS)
+            self.invalidate(doc.page_content)
+            return PASS, None
+
+        entry = {"question": doc.page_content, "answer": doc.metadata.get("answer"),
+                 "distance": distance, "created_at": doc.metadata.get("created_at")}
+        if normalize_question(question) == normalize_question(doc.page_content):
+            tier = SERVE
+        elif not same_literals(question, doc.page_content):
+            tier = PASS
+        else:
+            tier = SERVE if distance <= self.serve_distance else WARN if distance <= self.warn_distance else PASS
+        self._count(tier)
+        logger.info(f"Answer cache {tier} at distance {distance:.3f}; hit ratio {self.hit_ratio():.2f}")
+        return tier, entry if tier != PASS else None
+
+    def store_answer(self, question, answer, finish_reason=None, tool_failed=False):
+        """
+        Caches an answer in the background so the chat turn does not wait for the
+        insert. Answers that fail is_cacheable are not cached. Returns True when the
+        answer is being cached.
+        """
+        if not is_cacheable(answer, finish_reason, tool_failed):
+            logger.info("Answer not cached: empty, incomplete or built on a failed tool call")
+            return False
+        now = time.time()
+        metadata = {"answer": answer, "model_hash": self.model_hash, "data_summary_job_id": self.data_version(),
+                    "created_at": now, "expires_at": now + self.ttl_seconds}
+
+        def write():
+            try:
+                self.store.add_texts(texts=[question], metadatas=[metadata])
+            except Exception as e:
+                logger.error(f"Error caching answer: {str(e)}")
+            finally:
+                with self._lock:
+                    if self._pending_writes.get(question) is writer:
+                        del self._pending_writes[question]
+
+        writer = threading.Thread(target=write, name="answer-cache-writer", daemon=True)
+        with self._lock:
+            self._pending_writes[question] = writer
+        writer.start()
+        return True
+
+    def invalidate(self, question, timeout=30):
+        """
+        Removes every cached answer for exactly this question, e.g. after negative
+        feedback. A background write of that question still in flight is waited for
+        (up to `timeout` seconds) first, so it cannot land after the delete.
+        """
+        with self._lock:
+            writer = self._pending_writes.get(question)
+        if writer is not None:
+            writer.join(timeout)
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(text(f"DELETE FROM {self.table_name} WHERE document = :question"),
+                                   {"question": question})
+        except Exception as e:
+            logger.error(f"Error invalidating cached answer: {str(e)}")
+
+    def hit_ratio(self):
+        with self._lock:
+            lookups = self.counts[SERVE] + self.counts[WARN] + self.counts[PASS]
+            return (self.counts[SERVE] + self.counts[WARN]) / lookups if lookups else 0.0
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {**counts, "hit_ratio": self.hit_ratio()}
+
+
+def create_answer_cache():
+    settings = llm_config.get('answer_cache', {})
+    model_settings = model_config['model']
+    return AnswerCache(
+        settings.get('table', 'answer_cache'),
+        model_artifact_hash([model_settings['model_location'], model_settings['train_category_levels']]),
+        # The Chat2SQL client keeps the data summary job id current
+        lambda: registry.get('chat2sql').data_summary_job_id,
+        ttl_seconds=settings.get('ttl_hours', 24) * 3600,
+        serve_distance=settings.get('serve_distance', 0.05),
+        warn_distance=settings.get('warn_distance', 0.16),
+    )
+
+
+registry.register('answer_cache', create_answer_cache)
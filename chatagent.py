@@ -10,7 +10,7 @@ import json
 # Import your custom tools
 from toolbox import (
     generate_sql, execute_sql, subset_churn_contribution_analysis,
-    subset_clv_analysis, model_stat, generate_visualizations,
+    subset_clv_analysis, what_if_scenarios, model_stat, generate_visualizations,
     question_reformer, subset_shap_summary, customer_recommendations
 )
 
@@ -59,6 +59,14 @@ class SubsetCLVAnalysisTool(BaseTool):
         treatment_cost = input_dict.get('treatment_cost', 0.0)
         return subset_clv_analysis(input_dict['user_question'], input_dict['sql_generated'], treatment_cost)
 
+class WhatIfScenariosTool(BaseTool):
+    name = "What-If Scenarios"
+    description = "Compares several what-if scenarios (treatments or a sweep of feature values) on the same subset of data in one pass and returns churn and CLV for each. Input should be a JSON string with keys 'user_question', 'sql_generated' and 'scenarios' (a list of scenario objects with optional 'name', 'set', 'scale', 'add', 'treatment_cost', 'grid' or 'range')."
+
+    def _run(self, input_str: str):
+        input_dict = json.loads(input_str)
+        return what_if_scenarios(input_dict['user_question'], input_dict['sql_generated'], json.dumps(input_dict['scenarios']))
+
 class ModelStatTool(BaseTool):
     name = "Model Stats"
     description = "Returns the Model Stats to user. Use this tool for any question related to model accuracy."
@@ -103,6 +111,7 @@ tools = [
     ExecuteSQLTool(),
     SubsetChurnContributionAnalysisTool(),
     SubsetCLVAnalysisTool(),
+    WhatIfScenariosTool(),
     ModelStatTool(),
     GenerateVisualizationsTool(),
     QuestionReformerTool(),
@@ -123,12 +132,14 @@ Here are some guidelines for using the tools:
    - Execute SQL: {"user_question": "...", "sql_generated": "...", "output_mode": "json"}
    - Subset Churn Contribution Analysis: {"user_question": "...", "sql_generated": "..."}
    - Generate Visualizations: {"user_question": "...", "generated_sql": "..."}
+   - What-If Scenarios: {"user_question": "...", "sql_generated": "...", "scenarios": [{"grid": {"currentequipmentdays": [30, 60, 90]}}]}
 4. Use the Subset Churn Contribution Analysis tool to explain the impact of changes on churn for a subset of customers.
 5. Use the Subset CLV Analysis tool to explain the impact of changes on Customer Lifetime Value.
 6. Use the Model Stats tool when asked about model performance or accuracy.
 7. Use the Generate Visualizations tool when the user asks for charts or visual representations of data.
 8. Use the Subset SHAP Summary tool to understand the main reasons for churn in a subset of customers.
 9. Use the Customer Recommendations tool to generate personalized recommendations for high-risk customers.
+10. Use the What-If Scenarios tool once, with every scenario, when the user compares several treatments or feature values on the same subset.
 You have access to the following tools:
 
 {tools}
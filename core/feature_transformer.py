@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+
+class CompiledFeatureTransformer:
+    """
+    A class used to turn raw scoring data into model features quickly.
+
+    The lookup tables from normalized category values to integer codes are built
+    once from the training categories. A categorical column is then factorized and
+    only its distinct values go through the string normalization used at training
+    time (str, 'nan' -> 'unknown', lower, strip, '' -> 'unknown'). Every row is
+    mapped to its code with one array lookup, and values unseen in training become
+    missing, as set_categories would make them.
+
+    Attributes
+    ----------
+    cat_cols : list
+        List of categorical columns.
+    num_cols : list
+        List of numerical columns.
+    categories : dict
+        Training categories per categorical column, in training order.
+    code_tables : dict
+        Maps each normalized category value to its integer code, per column.
+
+    Methods
+    -------
+    normalize_values(values):
+        Applies the training-time string normalization to a Series of values.
+    encode(values, col):
+        Returns the integer category codes of a column's raw values.
+    transform(df):
+        Encodes the categorical columns and coerces the numerical ones in place.
+    """
+
+    def __init__(self, cat_cols, num_cols, train_categories):
+        """
+        Constructs the lookup tables.
+
+        Parameters
+        ----------
+            cat_cols : list
+                Categorical feature columns.
+            num_cols : list
+                Numerical feature columns.
+            train_categories : dict
+                Category levels per categorical column, as saved at training time.
+        """
+        self.cat_cols = list(cat_cols)
+        self.num_cols = list(num_cols)
+        self.categories = {col: list(train_categories[col]) for col in self.cat_cols}
+        self.code_tables = {col: {value: code for code, value in enumerate(levels)}
+                            for col, levels in self.categories.items()}
+
+    @staticmethod
+    def normalize_values(values):
+        """
+        Applies the training-time string normalization to a Series of values.
+
+        Parameters
+        ----------
+        values : pd.Series
+            Raw values.
+
+        Returns
+        -------
+        pd.Series
+            Normalized string values.
+        """
+        return (values
+                .astype(str)
+                .replace('nan', 'unknown')
+                .str.lower()
+                .str.strip()
+                .replace('', 'unknown')
+                .fillna('unknown'))
+
+    def _codes_for(self, values, col):
+        table = self.code_tables[col]
+        return np.fromiter((table.get(value, -1) for value in self.normalize_values(values)),
+                           dtype=np.int64, count=len(values))
+
+    def encode(self, values, col):
+        """
+        Returns the integer category codes (-1 for values unseen in training) of a
+        column's raw values.
+
+        Parameters
+        ----------
+        values : pd.Series
+            Raw values of the column.
+        col : str
+            Column name, used to pick the lookup table.
+
+        Returns
+        -------
+        np.ndarray
+            One code per row.
+        """
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Already dictionary encoded: normalize the categories, missing values read as 'nan'
+            codes = values.cat.codes.to_numpy()
+            levels = pd.Series(list(values.cat.categories) + [np.nan], dtype=object)
+            lookup = self._codes_for(levels, col)
+            return lookup[codes]
+
+        codes, uniques = pd.factorize(values)
+        if values.dtype == object and any(not isinstance(u, str) for u in uniques):
+            # Mixed Python objects may hash equal but print differently (1 vs 1.0 vs True)
+            codes, uniques = pd.factorize(values.astype(str).where(values.notna()))
+        lookup = self._codes_for(pd.Series(uniques, dtype=object), col)
+        encoded = np.empty(len(values), dtype=np.int64)
+        present = codes >= 0
+        encoded[present] = lookup[codes[present]]
+        if not present.all():
+            # Missing values are normalized from their own string form ('nan', 'None', ...)
+            na_codes, na_forms = pd.factorize(values[~present].astype(str), use_na_sentinel=False)
+            encoded[~present] = self._codes_for(pd.Series(na_forms, dtype=object), col)[na_codes]
+        return encoded
+
+    def transform(self, df):
+        """
+        Encodes the categorical columns with the training categories and coerces the
+        numerical columns to numbers (missing or unparsable values become 0), in place.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Scoring data holding every feature column.
+
+        Returns
+        -------
+        pd.DataFrame
+            The same DataFrame, ready for the model.
+        """
+        for col in self.cat_cols:
+            df[col] = pd.Categorical.from_codes(self.encode(df[col], col), categories=self.categories[col])
+
+        numeric = df[self.num_cols]
+        to_convert = [col for col in self.num_cols if not pd.api.types.is_numeric_dtype(numeric[col])]
+        if to_convert:
+            numeric = numeric.copy()
+            numeric[to_convert] = numeric[to_convert].apply(pd.to_numeric, errors='coerce')
+        df[self.num_cols] = numeric.fillna(0)
+        return df
@@ -0,0 +1,212 @@
+import json
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+
+def feature_matrix(df, feature_names):
+    """
+    Packs model features into one C-contiguous float32 matrix.
+
+    Categorical columns become their category codes (missing values and categories
+    unseen in training, code -1, become NaN), which is how XGBoost reads categorical
+    features from arrays when the booster carries the feature types.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data holding every feature column, categoricals already aligned to the
+        training categories.
+    feature_names : list
+        Feature columns in model order.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (len(df), len(feature_names)).
+    """
+    X = np.empty((len(df), len(feature_names)), dtype=np.float32)
+    dtypes = df.dtypes
+    categorical = [j for j, col in enumerate(feature_names) if isinstance(dtypes[col], pd.CategoricalDtype)]
+    numerical = sorted(set(range(len(feature_names))) - set(categorical))
+    if numerical:
+        # One block conversion; per-column access dominates the cost on small frames
+        X[:, numerical] = df[[feature_names[j] for j in numerical]].to_numpy(dtype=np.float32, na_value=np.nan)
+    for j in categorical:
+        codes = df[feature_names[j]].array.codes
+        X[:, j] = codes
+        X[codes < 0, j] = np.nan
+    return X
+
+
+class DMatrixBackend:
+    """Scores through a fresh xgb.DMatrix, the original scoring path."""
+
+    def __init__(self, booster):
+        self.booster = booster
+        self.feature_names = booster.feature_names
+
+    def predict_matrix(self, X):
+        return self.booster.predict(xgb.DMatrix(X, feature_names=self.feature_names,
+                                                feature_types=self.booster.feature_types, enable_categorical=True))
+
+    def predict(self, df):
+        return self.booster.predict(xgb.DMatrix(df[self.feature_names], enable_categorical=True))
+
+
+class InplacePredictBackend:
+    """Scores a contiguous float32 matrix with Booster.inplace_predict, without building a DMatrix."""
+
+    def __init__(self, booster):
+        self.booster = booster
+        self.feature_names = booster.feature_names
+
+    def predict_matrix(self, X):
+        return self.booster.inplace_predict(X, validate_features=False)
+
+    def predict(self, df):
+        return self.predict_matrix(feature_matrix(df, self.feature_names))
+
+
+class CompiledTreeBackend:
+    """
+    Scores with the booster's trees compiled into padded NumPy arrays.
+
+    Every tree is walked for every row at once, one level per step, so a prediction
+    costs max-depth rounds of array lookups and XGBoost is not called at all. Split
+    rules follow XGBoost: a numerical feature goes left when value < threshold, a
+    categorical feature goes right when its category is in the split's set, and a
+    missing value follows the node's default direction. Thresholds and inputs are
+    compared in float32, as XGBoost does; margins are summed in float32 too, so
+    results match the other backends to about 1e-6.
+
+    Supports gbtree boosters with a single output and the binary:logistic,
+    reg:logistic and reg:squarederror objectives.
+    """
+
+    SIGMOID_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+    IDENTITY_OBJECTIVES = ('reg:squarederror',)
+
+    def __init__(self, booster):
+        self.booster = booster
+        self.feature_names = booster.feature_names
+        learner = json.loads(booster.save_raw('json'))['learner']
+        objective = learner['objective']['name']
+        if objective not in self.SIGMOID_OBJECTIVES + self.IDENTITY_OBJECTIVES:
+            raise ValueError(f"Compiled trees do not support the {objective} objective")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError("Compiled trees only support gbtree boosters")
+        self.sigmoid = objective in self.SIGMOID_OBJECTIVES
+        base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+        # base_score is stored in output space; trees add to the margin
+        self.base_margin = np.float32(np.log(base_score / (1 - base_score)) if self.sigmoid else base_score)
+        self._compile(learner['gradient_booster']['model']['trees'])
+
+    def _compile(self, trees):
+        # Trees are padded to the same width and flattened; a node is tree * width + node_id
+        n_trees = len(trees)
+        width = max(len(tree['left_children']) for tree in trees)
+        self.tree_offset = np.arange(n_trees, dtype=np.int64) * width
+        self.left = np.zeros(n_trees * width, dtype=np.int64)
+        self.right = np.zeros(n_trees * width, dtype=np.int64)
+        self.feature = np.zeros(n_trees * width, dtype=np.int64)
+        self.threshold = np.zeros(n_trees * width, dtype=np.float32)
+        self.default_left = np.zeros(n_trees * width, dtype=bool)
+        self.category_row = np.full(n_trees * width, -1, dtype=np.int64)
+        category_sets = []
+        for t, tree in enumerate(trees):
+            n = len(tree['left_children'])
+            offset = t * width
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            right = np.asarray(tree['right_children'], dtype=np.int64)
+            nodes = np.arange(n, dtype=np.int64)
+            leaf = left < 0
+            # Leaves point to themselves, so extra steps leave finished rows in place
+            self.left[offset:offset + n] = offset + np.where(leaf, nodes, left)
+            self.right[offset:offset + n] = offset + np.where(leaf, nodes, right)
+            self.feature[offset:offset + n] = tree['split_indices']
+            # For leaves split_conditions holds the leaf value
+            self.threshold[offset:offset + n] = tree['split_conditions']
+            self.default_left[offset:offset + n] = np.asarray(tree['default_left'], dtype=bool)
+            categories = tree['categories']
+            for node, start, size in zip(tree['categories_nodes'], tree['categories_segments'], tree['categories_sizes']):
+                self.category_row[offset + node] = len(category_sets)
+                category_sets.append(categories[start:start + size])
+        self.depth = max(self._tree_depth(tree) for tree in trees)
+
+        # One row of membership flags per categorical split; the last column stands
+        # for codes outside every set (missing values and unseen categories)
+        self.has_categories = bool(category_sets)
+        self.outside_category = max((max(members) for members in category_sets if members), default=-1) + 1
+        self.category_width = self.outside_category + 1
+        table = np.zeros((max(len(category_sets), 1), self.category_width), dtype=bool)
+        for row, members in enumerate(category_sets):
+            table[row, members] = True
+        self.category_table = table.ravel()
+
+    @staticmethod
+    def _tree_depth(tree):
+        left, right = tree['left_children'], tree['right_children']
+        depth, level = 0, [0]
+        while True:
+            level = [child for node in level if left[node] >= 0 for child in (left[node], right[node])]
+            if not level:
+                return depth
+            depth += 1
+
+    def predict_margin(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_values = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.int64) * n_features)[:, np.newaxis]
+        node = np.broadcast_to(self.tree_offset, (n_rows, len(self.tree_offset)))
+        for _ in range(self.depth):
+            values = flat_values.take(row_offset + self.feature.take(node))
+            go_left = values < self.threshold.take(node)
+            if self.has_categories:
+                category_row = self.category_row.take(node)
+                # Codes outside every set, missing values and numerical nodes look up the last column
+                codes = np.where((values >= 0) & (values < self.outside_category), values, self.outside_category)
+                in_set = self.category_table.take(np.maximum(category_row, 0) * self.category_width + codes.astype(np.int64))
+                go_left = np.where(category_row >= 0, ~in_set, go_left)
+            go_left = np.where(np.isnan(values), self.default_left.take(node), go_left)
+            node = np.where(go_left, self.left.take(node), self.right.take(node))
+        return self.base_margin + self.threshold.take(node).sum(axis=1, dtype=np.float32)
+
+    def predict_matrix(self, X):
+        margin = self.predict_margin(X)
+        if self.sigmoid:
+            return (1 / (1 + np.exp(-margin))).astype(np.float32)
+        return margin
+
+    def predict(self, df):
+        return self.predict_matrix(feature_matrix(df, self.feature_names))
+
+
+BACKENDS = {
+    'dmatrix': DMatrixBackend,
+    'inplace': InplacePredictBackend,
+    'compiled': CompiledTreeBackend,
+}
+
+
+def make_backend(booster, name='inplace'):
+    """
+    Builds the inference backend `name` ('dmatrix', 'inplace' or 'compiled') for a booster.
+
+    Parameters
+    ----------
+    booster : xgb.Booster
+        The trained model.
+    name : str, optional
+        Backend name, usually model.inference_backend in conf_telchurn.yml.
+
+    Returns
+    -------
+    object
+        A backend with predict(df) and predict_matrix(X) (X from feature_matrix),
+        both returning one probability per row.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](booster)
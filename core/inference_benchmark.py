@@ -0,0 +1,118 @@
+"""
+Parity check and micro-benchmark for the inference backends in core.inference.
+
+Rows are synthesized from the model itself: numerical values are drawn around the
+split thresholds the trees actually use (plus some missing values) and categorical
+values from the training categories (plus missing ones), so every branch and every
+default direction gets exercised. Each backend is compared with the DMatrix path,
+then timed on single rows and on batches.
+
+    python -m core.inference_benchmark --rows 100000 --sizes 1 100 10000
+"""
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+import yaml
+from core.inference import BACKENDS, CompiledTreeBackend, feature_matrix, make_backend
+
+
+def synthetic_rows(booster, train_categories, count, rng, missing_rate=0.05):
+    compiled = CompiledTreeBackend(booster)
+    internal = compiled.left != np.arange(len(compiled.left))
+    data = {}
+    for j, (col, kind) in enumerate(zip(booster.feature_names, booster.feature_types)):
+        missing = rng.random(count) < missing_rate
+        if kind == 'c':
+            codes = rng.integers(0, len(train_categories[col]), size=count)
+            codes[missing] = -1
+            data[col] = pd.Categorical.from_codes(codes, categories=train_categories[col])
+            continue
+        thresholds = np.unique(compiled.threshold[internal & (compiled.feature == j)])
+        if len(thresholds):
+            values = rng.choice(thresholds, size=count).astype(np.float64)
+            values += rng.normal(size=count) * np.maximum(np.abs(values), 1) * 0.05
+            # Some values sit exactly on a threshold, where < versus <= matters
+            exact = rng.random(count) < 0.1
+            values[exact] = rng.choice(thresholds, size=exact.sum())
+        else:
+            values = rng.normal(size=count)
+        values[missing] = np.nan
+        data[col] = values
+    return pd.DataFrame(data)
+
+
+def check_parity(backends, df, reference):
+    report = {}
+    for name, backend in backends.items():
+        predictions = backend.predict(df)
+        report[name] = float(np.max(np.abs(predictions - reference)))
+    return report
+
+
+def time_call(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def benchmark(backends, df, sizes, repeat):
+    report = {}
+    for size in sizes:
+        batch = df.iloc[:size].reset_index(drop=True)
+        matrix = feature_matrix(batch, next(iter(backends.values())).feature_names)
+        report[size] = {}
+        for name, backend in backends.items():
+            report[size][name] = {'frame': time_call(lambda: backend.predict(batch), repeat)}
+            if hasattr(backend, 'predict_matrix'):
+                report[size][name]['matrix'] = time_call(lambda: backend.predict_matrix(matrix), repeat)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="conf_telchurn.yml")
+    parser.add_argument("--rows", type=int, default=100000, help="rows used for the parity check")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    with open(config['model']['model_location'], 'rb') as f:
+        booster = pickle.load(f)
+    with open(config['model']['train_category_levels'], 'r') as f:
+        train_categories = json.load(f)
+
+    df = synthetic_rows(booster, train_categories, max(args.rows, max(args.sizes)), np.random.default_rng(args.seed))
+    backends = {name: make_backend(booster, name) for name in BACKENDS}
+    reference = backends['dmatrix'].predict(df)
+
+    print(f"== parity on {len(df):,} rows (max |difference| from dmatrix) ==")
+    failed = False
+    for name, difference in check_parity(backends, df, reference).items():
+        status = "ok" if difference <= args.tolerance else "FAILED"
+        failed |= difference > args.tolerance
+        print(f"  {name:<10} {difference:.2e}  {status}")
+
+    print("\n== median latency (predict(df) / predict_matrix(X)) ==")
+    for size, timings in benchmark(backends, df, args.sizes, args.repeat).items():
+        print(f"  {size:,} rows")
+        for name, values in timings.items():
+            line = f"    {name:<10} {values['frame'] * 1e6:>12.1f} us"
+            if 'matrix' in values:
+                line += f"  {values['matrix'] * 1e6:>12.1f} us"
+            print(line)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
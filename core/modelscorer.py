@@ -1,8 +1,11 @@
 import json
-import xgboost as xgb
+import numpy as np
 import pandas as pd
 import yaml
 import pickle
+from core.feature_transformer import CompiledFeatureTransformer
+from core.inference import feature_matrix, make_backend
+from core.prediction_cache import PredictionCache, model_artifact_hash
 
 class ModelScorer:
     """
@@ -24,6 +27,12 @@ class ModelScorer:
         The XGBoost model.
     train_categories : dict
         Categories used during training.
+    feature_transformer : CompiledFeatureTransformer
+        Precompiled categorical encoding and numerical coercion of the features.
+    inference_backend : object
+        Scores the model features (see core.inference), picked by model.inference_backend.
+    prediction_cache : PredictionCache or None
+        Predictions memoized per feature row, when model.prediction_cache is enabled.
 
     Methods
     -------
@@ -35,6 +44,14 @@ class ModelScorer:
         Sets the categories of the production data to be the same as the ones used during training.
     model_predictor(df):
         Predicts the target variable using the model.
+    predict_matrix(X):
+        Scores a feature matrix, through the prediction cache when it is enabled.
+    score_stream(chunks, aggregate_columns=('prediction', 'new_prediction'), before=None, after=None):
+        Scores an iterator of DataFrame or Arrow chunks, keeping running aggregates.
+    expand_scenarios(scenarios):
+        Expands scenario specs with grids or ranges into one scenario per variant.
+    score_scenarios(df, scenarios):
+        Scores a subset under several feature overrides in one batched prediction.
     """
 
     def __init__(self, model_config_file='./conf_telchurn.yml'):
@@ -55,6 +72,17 @@ class ModelScorer:
             self.xgb_model = pickle.load(f)
         with open(self.model_config['model']['train_category_levels'], 'r') as f:
             self.train_categories = json.load(f)
+        self.feature_transformer = CompiledFeatureTransformer(self.cat_cols, self.num_cols, self.train_categories)
+        backend_name = self.model_config['model'].get('inference_backend', 'inplace')
+        self.inference_backend = make_backend(self.xgb_model, backend_name)
+        cache_settings = self.model_config['model'].get('prediction_cache', {})
+        self.prediction_cache = None
+        if cache_settings.get('enabled', False):
+            model_hash = model_artifact_hash([self.model_config['model']['model_location'],
+                                              self.model_config['model']['train_category_levels']])
+            # Backends agree only to float32 precision, so each keeps its own predictions
+            self.prediction_cache = PredictionCache(f"{model_hash}:{backend_name}",
+                                                    cache_settings.get('max_entries', 500000))
 
     def replace_columns_with_suffix_or_prefix(self, df: pd.DataFrame, suffix: str = '_1', prefix: str = 'new_') -> pd.DataFrame:
         """
@@ -144,18 +172,242 @@ class ModelScorer:
         """
         df2 = self.replace_columns_with_suffix_or_prefix(df)
         df2 = self.convert_bools_to_yes_no(df2)
-        for col in self.cat_cols:
-            df2[col] = (df2[col]
-                            .astype(str)
-                            .replace('nan', 'unknown')
-                            .str.lower()
-                            .str.strip()
-                            .replace('', 'unknown')
-                            .fillna('unknown')
-                            .astype('category'))
-
-        for col in self.num_cols:
-            df2[col] = pd.to_numeric(df2[col], errors='coerce').fillna(0)
-        df3 = self.align_categories(df2)
-        df3['new_prediction'] = self.xgb_model.predict(xgb.DMatrix(df3[self.xgb_model.feature_names], enable_categorical=True))
-        return df3
\ No newline at end of file
+        # Same result as normalizing each column's strings and then align_categories, via lookup tables
+        df3 = self.feature_transformer.transform(df2)
+        if self.prediction_cache is None:
+            df3['new_prediction'] = self.inference_backend.predict(df3)
+        else:
+            df3['new_prediction'] = self.predict_matrix(feature_matrix(df3, self.xgb_model.feature_names))
+        return df3
+
+    def predict_matrix(self, X):
+        """
+        Scores a feature matrix (see core.inference.feature_matrix), through the
+        prediction cache when it is enabled.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Feature matrix in model feature order.
+
+        Returns
+        -------
+        np.ndarray
+            One prediction per row.
+        """
+        if self.prediction_cache is None:
+            return self.inference_backend.predict_matrix(X)
+        return self.prediction_cache.predict(X, self.inference_backend.predict_matrix)
+
+    def score_stream(self, chunks, aggregate_columns=('prediction', 'new_prediction'), before=None, after=None):
+        """
+        Scores data chunk by chunk so memory stays bounded by the chunk size.
+
+        Parameters
+        ----------
+        chunks : iterable
+            pd.DataFrame chunks, or Arrow tables/record batches (anything with to_pandas()).
+        aggregate_columns : iterable of str, optional
+            Columns whose running sum and mean are kept over all chunks.
+        before : callable, optional
+            Called as before(chunk) on the raw chunk, before the treated columns replace
+            the original ones (e.g. to compute a metric on the current values).
+        after : callable, optional
+            Called as after(chunk) on the scored chunk.
+
+        Returns
+        -------
+        ScoreStream
+            Iterating it yields each scored chunk; its `aggregates` are updated as it goes.
+        """
+        return ScoreStream(self, chunks, aggregate_columns, before, after)
+
+
+    @staticmethod
+    def expand_scenarios(scenarios):
+        """
+        Expands scenario specs into one scenario per scored variant.
+
+        A spec is a dict with an optional 'name', optional overrides applied in this
+        order: 'set' ({feature: value}), 'scale' ({feature: factor}) and 'add'
+        ({feature: amount}), an optional 'treatment_cost' per customer, and at most
+        one sweep: 'grid' ({feature: [values]}) or 'range' ({feature: [start, stop, step]},
+        stop included). A sweep yields one scenario per value.
+
+        Parameters
+        ----------
+        scenarios : list of dict
+            Scenario specs.
+
+        Returns
+        -------
+        list of dict
+            Scenarios with 'name', 'set', 'scale', 'add' and 'treatment_cost'.
+        """
+        expanded = []
+        for spec in scenarios:
+            sweeps = {feature: list(values) for feature, values in spec.get('grid', {}).items()}
+            for feature, (start, stop, step) in spec.get('range', {}).items():
+                if step <= 0:
+                    raise ValueError(f"The range step for {feature} must be positive.")
+                steps = int(np.floor((stop - start) / step + 1e-9))
+                sweeps[feature] = [round(start + k * step, 10) for k in range(steps + 1)]
+            if len(sweeps) > 1:
+                raise ValueError("A scenario can sweep only one feature; split the sweeps into separate scenarios.")
+            variants = [({}, None)]
+            if sweeps:
+                feature, values = next(iter(sweeps.items()))
+                variants = [({feature: value}, f"{feature}={value}") for value in values]
+            for sweep_value, label in variants:
+                scenario = {
+                    'set': {**spec.get('set', {}), **sweep_value},
+                    'scale': dict(spec.get('scale', {})),
+                    'add': dict(spec.get('add', {})),
+                    'treatment_cost': float(spec.get('treatment_cost', 0.0)),
+                }
+                if spec.get('name'):
+                    scenario['name'] = f"{spec['name']}: {label}" if label else spec['name']
+                else:
+                    scenario['name'] = ModelScorer._describe_scenario(scenario)
+                expanded.append(scenario)
+        return expanded
+
+    @staticmethod
+    def _describe_scenario(scenario):
+        parts = [f"{feature}={value}" for feature, value in scenario['set'].items()]
+        parts += [f"{feature}x{value}" for feature, value in scenario['scale'].items()]
+        parts += [f"{feature}{value:+}" for feature, value in scenario['add'].items()]
+        return ", ".join(parts) or "no change"
+
+    @staticmethod
+    def _apply_override(values, kind, value):
+        if kind == 'set':
+            values[:] = float(value)
+        elif kind == 'scale':
+            values *= float(value)
+        else:
+            values += float(value)
+
+    def score_scenarios(self, df, scenarios):
+        """
+        Scores a subset under several what-if scenarios in one batched prediction.
+
+        The subset is encoded once; the feature matrix is then stacked once per
+        scenario (plus an unchanged baseline), each block gets its overrides, and
+        the whole stack is scored in a single call to the inference backend.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The subset of customers, with every feature column.
+        scenarios : list of dict
+            Scenario specs, see expand_scenarios.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per scenario, baseline first: the number of customers, the average
+            churn probability (%) and its change from the baseline (percentage points),
+            the average 1-year CLV (9% discount rate, net of the treatment cost) and the
+            CLV impact per customer and in total.
+        """
+        expanded = [{'name': 'baseline', 'set': {}, 'scale': {}, 'add': {}, 'treatment_cost': 0.0}]
+        expanded += self.expand_scenarios(scenarios)
+
+        base = self.replace_columns_with_suffix_or_prefix(df.copy())
+        base = self.feature_transformer.transform(self.convert_bools_to_yes_no(base))
+        feature_names = self.xgb_model.feature_names
+        position = {feature: j for j, feature in enumerate(feature_names)}
+        base_X = feature_matrix(base, feature_names)
+        base_revenue = base['monthlyrevenue'].to_numpy(dtype=np.float64)
+        n = len(base_X)
+
+        stacked = np.tile(base_X, (len(expanded), 1))
+        revenues = []
+        for i, scenario in enumerate(expanded):
+            block = stacked[i * n:(i + 1) * n]
+            revenue = base_revenue.copy()
+            for kind in ('set', 'scale', 'add'):
+                for feature, value in scenario[kind].items():
+                    if feature not in position:
+                        raise ValueError(f"Unknown model feature '{feature}' in scenario '{scenario['name']}'.")
+                    if feature in self.cat_cols:
+                        if kind != 'set':
+                            raise ValueError(f"Categorical feature '{feature}' can only be set, not {kind}d.")
+                        code = self.feature_transformer.encode(pd.Series([value], dtype=object), feature)[0]
+                        block[:, position[feature]] = code if code >= 0 else np.nan
+                        continue
+                    self._apply_override(block[:, position[feature]], kind, value)
+                    if feature == 'monthlyrevenue':
+                        self._apply_override(revenue, kind, value)
+            revenues.append(revenue)
+
+        predictions = self.predict_matrix(stacked).astype(np.float64).reshape(len(expanded), n)
+        rows = []
+        for scenario, revenue, prediction in zip(expanded, revenues, predictions):
+            clv = (revenue * 12 - scenario['treatment_cost']) * (1 - prediction) / (0.09 + prediction)
+            rows.append({'scenario': scenario['name'], 'customers': n,
+                         'avg_churn': prediction.mean(), 'avg_clv': clv.mean()})
+        table = pd.DataFrame(rows)
+        table['churn_change'] = table['avg_churn'] - table['avg_churn'].iloc[0]
+        table['clv_impact_per_customer'] = table['avg_clv'] - table['avg_clv'].iloc[0]
+        table['total_clv_impact'] = table['clv_impact_per_customer'].round(2) * n
+        table[['avg_churn', 'churn_change']] *= 100
+        return table[['scenario', 'customers', 'avg_churn', 'churn_change', 'avg_clv',
+                      'clv_impact_per_customer', 'total_clv_impact']].round(2)
+
+class StreamAggregates:
+    """
+    Running row count, sums and non-missing counts of columns over a stream of
+    DataFrames. Means skip missing values, like pd.Series.mean.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.rows = 0
+        self.sums = dict.fromkeys(self.columns, 0.0)
+        self.counts = dict.fromkeys(self.columns, 0)
+
+    def update(self, df):
+        self.rows += len(df)
+        for col in self.columns:
+            if col in df.columns:
+                self.sums[col] += float(df[col].sum())
+                self.counts[col] += int(df[col].count())
+
+    def mean(self, col):
+        return self.sums[col] / self.counts[col] if self.counts[col] else float('nan')
+
+
+class ScoreStream:
+    """
+    Iterable returned by ModelScorer.score_stream. Yields each scored chunk and keeps
+    StreamAggregates over them; `run()` consumes the stream and returns the aggregates.
+    """
+
+    def __init__(self, scorer, chunks, aggregate_columns, before=None, after=None):
+        self.scorer = scorer
+        self.chunks = chunks
+        self.before = before
+        self.after = after
+        self.aggregates = StreamAggregates(aggregate_columns)
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if not isinstance(chunk, pd.DataFrame):
+                chunk = chunk.to_pandas()
+            if chunk.empty:
+                continue
+            chunk = chunk.reset_index(drop=True)
+            if self.before is not None:
+                self.before(chunk)
+            scored = self.scorer.model_predictor(chunk)
+            if self.after is not None:
+                self.after(scored)
+            self.aggregates.update(scored)
+            yield scored
+
+    def run(self):
+        for _ in self:
+            pass
+        return self.aggregates
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+
+def model_artifact_hash(paths):
+    """Hashes the content of the model artifacts, to tell the caches of one trained model from another's."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    A class used to memoize model predictions per feature row.
+
+    Rows are keyed by a 64-bit hash of their aligned feature vector (the float32
+    matrix the model scores), computed for all rows at once with
+    pd.util.hash_pandas_object. Entries are held in a sorted uint64 key array with
+    parallel value and last-use arrays, so a whole batch is looked up with one
+    np.searchsorted instead of a Python loop. The cache lives in memory and is built
+    by its ModelScorer with the scorer's model, so it never outlives that model;
+    `model_hash` only records which artifacts (and backend) the entries came from.
+    Memory is bounded by `max_entries`; recency is tracked per predict() call, and
+    the entries of the least recently used calls are evicted first.
+
+    Attributes
+    ----------
+    model_hash : str
+        Hash of the model artifacts the cached predictions come from, for reporting.
+    max_entries : int
+        Maximum number of cached rows.
+    hits : int
+        Rows served from the cache.
+    misses : int
+        Rows sent to the model.
+
+    Methods
+    -------
+    row_hashes(X):
+        Returns one 64-bit hash per row of a feature matrix.
+    predict(X, predict_matrix):
+        Returns predictions for X, scoring only the rows not in the cache.
+    stats():
+        Returns the model hash, entry count, hits, misses and hit ratio.
+    """
+
+    def __init__(self, model_hash, max_entries=500000):
+        """
+        Parameters
+        ----------
+            model_hash : str
+                Hash of the model artifacts, see model_artifact_hash.
+            max_entries : int, optional
+                Maximum number of cached rows (default is 500000).
+        """
+        self.model_hash = model_hash
+        self.max_entries = max_entries
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.values = np.empty(0, dtype=np.float32)
+        self.last_used = np.empty(0, dtype=np.int64)
+        self.hits = 0
+        self.misses = 0
+        self._batch = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def row_hashes(X):
+        """
+        Returns one 64-bit hash per row of a feature matrix.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Feature matrix, one row per customer.
+
+        Returns
+        -------
+        np.ndarray
+            uint64 hashes.
+        """
+        return pd.util.hash_pandas_object(pd.DataFrame(X, copy=False), index=False).to_numpy()
+
+    def predict(self, X, predict_matrix):
+        """
+        Returns predictions for X, sending only the rows missing from the cache to
+        `predict_matrix` (e.g. the rows that carry a treatment).
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Feature matrix, as built by core.inference.feature_matrix.
+        predict_matrix : callable
+            Scores a feature matrix.
+
+        Returns
+        -------
+        np.ndarray
+            One prediction per row.
+        """
+        keys = self.row_hashes(X)
+        predictions = np.empty(len(keys), dtype=np.float32)
+        with self._lock:
+            self._batch += 1
+            batch = self._batch
+            positions = np.searchsorted(self.keys, keys)
+            found = positions < len(self.keys)
+            found[found] = self.keys[positions[found]] == keys[found]
+            predictions[found] = self.values[positions[found]]
+            self.last_used[positions[found]] = batch
+        missing = ~found
+        n_missing = int(missing.sum())
+        if n_missing:
+            scored = np.asarray(predict_matrix(X[missing]), dtype=np.float32)
+            predictions[missing] = scored
+            with self._lock:
+                self._insert(keys[missing], scored, batch)
+        with self._lock:
+            self.hits += len(keys) - n_missing
+            self.misses += n_missing
+        return predictions
+
+    def _insert(self, keys, values, batch):
+        # Another thread may have stored some of the same rows meanwhile; np.unique keeps
+        # the first occurrence, i.e. the entry already in the cache
+        keys = np.concatenate([self.keys, keys])
+        values = np.concatenate([self.values, values])
+        last_used = np.concatenate([self.last_used, np.full(len(keys) - len(self.keys), batch, dtype=np.int64)])
+        keys, first = np.unique(keys, return_index=True)
+        values, last_used = values[first], last_used[first]
+        if len(keys) > self.max_entries:
+            keep = np.argpartition(last_used, len(keys) - self.max_entries)[len(keys) - self.max_entries:]
+            keep.sort()
+            keys, values, last_used = keys[keep], values[keep], last_used[keep]
+        self.keys, self.values, self.last_used = keys, values, last_used
+
+    def stats(self):
+        """Returns the model hash, entry count, hits, misses and hit ratio."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {'model_hash': self.model_hash, 'entries': len(self.keys), 'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': self.hits / total if total else 0.0}
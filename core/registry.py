@@ -0,0 +1,239 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceRegistry:
+    """
+    A lazy, thread-safe registry of heavy process-wide clients.
+
+    Each resource is described by a factory and built once, on first use, no matter
+    how many modules or threads ask for it. Optional health checks run out of band,
+    on a background timer (start_health_checks), never on a request thread. A
+    resource that fails its check is replaced by a freshly built one; the old
+    instance is only closed after `retire_grace` seconds, so calls still using it
+    can finish. Close hooks run on shutdown.
+
+    Methods
+    -------
+    register(name, factory, health_check=None, close=None):
+        Declares a resource without constructing it.
+    get(name):
+        Returns the resource, constructing it on first use.
+    proxy(name):
+        Returns a stand-in object that resolves the resource on every attribute access.
+    warmup(names=None, background=False):
+        Constructs resources ahead of their first use.
+    check_health(names=None):
+        Runs the health checks and replaces unhealthy resources.
+    start_health_checks(interval=60.0):
+        Runs check_health every `interval` seconds on a background thread.
+    shutdown():
+        Runs the close hooks of every constructed resource and forgets them.
+    """
+
+    def __init__(self, retire_grace=600.0):
+        """
+        Parameters
+        ----------
+            retire_grace : float, optional
+                Seconds a replaced resource is kept open before its close hook runs
+                (default is 600), longer than any call using it should last.
+        """
+        self.retire_grace = retire_grace
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._retired = []          # (timer, name, instance) waiting to be closed
+        self._health_thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, health_check=None, close=None):
+        """
+        Declares a resource. Registering a name again is a no-op, so modules that are
+        imported several times (e.g. on app reruns) can register unconditionally.
+
+        Parameters
+        ----------
+            name : str
+                Name the resource is looked up by.
+            factory : callable
+                Builds the resource; called with no arguments.
+            health_check : callable, optional
+                Receives the resource and returns True if it is usable.
+            close : callable, optional
+                Receives the resource and releases it on shutdown.
+        """
+        with self._lock:
+            if name not in self._factories:
+                self._factories[name] = (factory, health_check, close)
+                self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        """Returns the named resource, constructing it first if this is its first use."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._factories:
+            raise KeyError(f"Resource '{name}' is not registered")
+        # One lock per resource so a slow construction does not block the others
+        with self._locks[name]:
+            if name not in self._instances:
+                logger.info(f"Constructing resource: {name}")
+                self._instances[name] = self._factories[name][0]()
+            return self._instances[name]
+
+    def proxy(self, name):
+        """Returns a LazyResource standing in for the named resource."""
+        return LazyResource(self, name)
+
+    def warmup(self, names=None, background=False):
+        """
+        Constructs the given resources (all registered ones by default) in parallel.
+        Failures are logged and the resource stays lazy. With background=True this
+        returns immediately.
+        """
+        names = list(self._factories) if names is None else list(names)
+
+        def build(name):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Warmup of resource {name} failed: {e}")
+
+        def build_all():
+            with ThreadPoolExecutor(max_workers=max(1, len(names))) as executor:
+                list(executor.map(build, names))
+
+        if background:
+            threading.Thread(target=build_all, name="registry-warmup", daemon=True).start()
+        else:
+            build_all()
+
+    def check_health(self, names=None):
+        """
+        Runs the health check of every constructed resource (or the given ones). A
+        resource that fails is rebuilt and swapped in; callers holding the old
+        instance keep using it, and it is closed `retire_grace` seconds later. When
+        the rebuild fails too, the old instance stays in place.
+
+        Returns
+        -------
+            dict
+                {name: True/False} for the checked resources.
+        """
+        names = list(self._instances) if names is None else [n for n in names if n in self._instances]
+        status = {}
+        for name in names:
+            factory, health_check, close = self._factories[name]
+            if health_check is None:
+                status[name] = True
+                continue
+            instance = self._instances.get(name)
+            try:
+                status[name] = bool(health_check(instance))
+            except Exception as e:
+                logger.warning(f"Health check of resource {name} failed: {e}")
+                status[name] = False
+            if not status[name]:
+                self._replace(name, instance, factory, close)
+        return status
+
+    def _replace(self, name, instance, factory, close):
+        try:
+            replacement = factory()
+        except Exception as e:
+            logger.error(f"Rebuilding resource {name} failed, keeping the current instance: {e}")
+            return
+        with self._locks[name]:
+            if self._instances.get(name) is not instance:
+                # Replaced meanwhile; drop the instance just built
+                self._close(name, replacement, close)
+                return
+            self._instances[name] = replacement
+        logger.info(f"Rebuilt resource {name}; the old instance closes in {self.retire_grace:.0f}s")
+        self._retire(name, instance, close)
+
+    def _retire(self, name, instance, close):
+        if close is None:
+            return
+
+        def close_retired():
+            with self._lock:
+                self._retired = [entry for entry in self._retired if entry[2] is not instance]
+            self._close(name, instance, close)
+
+        timer = threading.Timer(self.retire_grace, close_retired)
+        timer.daemon = True
+        with self._lock:
+            self._retired.append((timer, name, instance))
+        timer.start()
+
+    def start_health_checks(self, interval=60.0):
+        """Runs check_health every `interval` seconds on a daemon thread. Calling it again is a no-op."""
+        with self._lock:
+            if self._health_thread is not None:
+                return
+
+            def run():
+                while not self._stopping.wait(interval):
+                    try:
+                        self.check_health()
+                    except Exception as e:
+                        logger.error(f"Health checks failed: {e}")
+
+            self._health_thread = threading.Thread(target=run, name="registry-health", daemon=True)
+            self._health_thread.start()
+
+    def shutdown(self):
+        """Runs the close hooks of every constructed and retired resource, newest first, and forgets them."""
+        self._stopping.set()
+        with self._lock:
+            retired, self._retired = self._retired, []
+        for timer, name, instance in retired:
+            timer.cancel()
+            self._close(name, instance, self._factories[name][2])
+        for name in reversed(list(self._instances)):
+            with self._locks[name]:
+                instance = self._instances.pop(name, None)
+            if instance is not None:
+                self._close(name, instance, self._factories[name][2])
+
+    @staticmethod
+    def _close(name, instance, close):
+        if close is None:
+            return
+        try:
+            close(instance)
+        except Exception as e:
+            logger.warning(f"Closing resource {name} failed: {e}")
+
+
+class LazyResource:
+    """
+    Attribute access on this object is forwarded to the registry's resource, which is
+    built on first access. Each access resolves the resource again; code making
+    several calls should take the instance once with registry.get.
+    """
+
+    def __init__(self, registry, name):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._registry.get(self._name), attribute, value)
+
+    def __repr__(self):
+        return f"<LazyResource {self._name}>"
+
+
+# Process-wide registry
+registry = ResourceRegistry()
+atexit.register(registry.shutdown)
@@ -2,10 +2,23 @@ import os
 import yaml
 from dotenv import load_dotenv
 from langchain_community.vectorstores import TiDBVectorStore
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import json
+import uuid
 import logging
 import time
+import threading
+from contextlib import contextmanager
+from sqlalchemy import inspect
 from tenacity import retry, stop_after_attempt, wait_fixed
+from core.registry import registry
+from query_engine.embedding_cache import get_cached_embeddings
+from query_engine.engine_registry import get_engine, shared_engine_args
+from query_engine.sqlknowledgebase import insert_embedded_rows
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -19,18 +32,26 @@ with open('llm_configs.yml', 'r') as f:
 tidb_connection_string = os.getenv('TIDB_CONNECTION_URL')
 google_api_key = os.getenv('GOOGLE_API_KEY')
 
-# Initialize Google embedding model
-embeddings = GoogleGenerativeAIEmbeddings(model=llm_config['embedding_model'], google_api_key=google_api_key)
+# Relative spool paths are anchored here, not to the working directory of whoever starts the app
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Google embedding model behind the process-wide embedding cache shared with the SQL knowledge base
+embeddings = get_cached_embeddings(llm_config['embedding_model'], google_api_key, caller='feedback_store')
+
+# Global variable to store the vector store instance
+vector_store = None
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
 def get_vector_store(table_name):
     global vector_store
     try:
-        if vector_store is None or not vector_store.is_connected():
+        # Liveness is handled by the engine pool's pre-ping, so no per-call check is needed
+        if vector_store is None:
             store = TiDBVectorStore(
                 embedding_function=embeddings,
                 connection_string=tidb_connection_string,
                 table_name=table_name,
+                engine_args=shared_engine_args(tidb_connection_string),
             )
             vector_store = store
             logger.info(f"Connected to vector store: {table_name}")
@@ -40,33 +61,172 @@ def get_vector_store(table_name):
         vector_store = None
         raise
 
-# Add a method to check connection
-def is_connected(self):
-    try:
-        # Perform a simple query to check connection
-        self.client.execute("SELECT 1")
-        return True
-    except Exception:
-        return False
+def ensure_table(table_name):
+    """Makes sure the feedback table exists; opening the vector store creates it if it does not."""
+    global vector_store
+    if not inspect(get_engine(tidb_connection_string)).has_table(table_name):
+        # Dropped after the store was opened: reopen it to recreate the table
+        vector_store = None
+    get_vector_store(table_name)
 
-# Monkey patch the TiDBVectorStore class to add the is_connected method
-TiDBVectorStore.is_connected = is_connected
+class FeedbackQueue:
+    """
+    Write-behind queue for feedback.
+
+    `put` appends the feedback to a local JSONL spool file (fsynced, so nothing is
+    lost on a crash) and returns at once. A background worker flushes the spool in
+    batches: one embedding request and one multi-row insert per batch. Failed
+    batches stay in the spool and are retried with exponential backoff; leftovers
+    from a previous run are flushed on start.
+
+    Every process running the app shares the spool, so reads and rewrites hold an
+    fcntl lock on `<spool_path>.lock` (only a thread lock where fcntl is missing).
+    A relative spool_path is resolved against the repository root.
+    """
+
+    def __init__(self, table_name, spool_path='feedback_spool.jsonl', batch_size=32, flush_interval=2.0,
+                 max_backoff=60.0):
+        self.table_name = table_name
+        self.spool_path = os.path.join(REPO_ROOT, spool_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self._spool_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        # Set once ensure_table has succeeded; rechecked only after a failed insert
+        self._table_ready = False
+        self._worker = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._worker.start()
+
+    def put(self, question, answer, feedback):
+        # The id travels with the record so a retried batch upserts instead of duplicating
+        record = {"id": str(uuid.uuid4()), "question": question, "answer": answer,
+                  "feedback": feedback, "created_at": time.time()}
+        with self._locked_spool():
+            with open(self.spool_path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self._wakeup.set()
+
+    def pending(self):
+        with self._locked_spool():
+            return self._read_spool()
+
+    @contextmanager
+    def _locked_spool(self):
+        with self._spool_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.spool_path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_spool(self):
+        if not os.path.exists(self.spool_path):
+            return []
+        records = []
+        with open(self.spool_path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write
+                    logger.warning("Skipping unreadable feedback spool line")
+        return records
+
+    def _remove_from_spool(self, flushed_ids):
+        with self._locked_spool():
+            remaining = [r for r in self._read_spool() if r["id"] not in flushed_ids]
+            tmp_path = self.spool_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.writelines(json.dumps(r) + "\n" for r in remaining)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.spool_path)
+
+    def flush(self):
+        """Writes every spooled record, a batch at a time. Raises if a batch fails."""
+        with self._flush_lock:
+            records = self.pending()
+            for start in range(0, len(records), self.batch_size):
+                batch = records[start:start + self.batch_size]
+                self._write_batch(batch)
+                self._remove_from_spool({r["id"] for r in batch})
+                logger.info(f"Flushed {len(batch)} feedback records")
+
+    def _write_batch(self, batch):
+        texts = [r["question"] for r in batch]
+        metadatas = [{"answer": r["answer"], "feedback": r["feedback"]} for r in batch]
+        ids = [r["id"] for r in batch]
+        if not self._table_ready:
+            ensure_table(self.table_name)
+            self._table_ready = True
+        vectors = embeddings.embed_documents(texts)
+        rows = list(zip(ids, vectors, texts, metadatas))
+        engine = get_engine(tidb_connection_string)
+        try:
+            insert_embedded_rows(engine, self.table_name, rows)
+        except Exception:
+            if inspect(engine).has_table(self.table_name):
+                raise
+            # The table was dropped while the app was running: recreate it and retry once
+            logger.warning(f"Feedback table {self.table_name} is missing, recreating it")
+            ensure_table(self.table_name)
+            insert_embedded_rows(engine, self.table_name, rows)
+
+    def _run(self):
+        try:
+            ensure_table(self.table_name)
+            self._table_ready = True
+        except Exception as e:
+            # Retried by the first batch written
+            logger.error(f"Could not open the feedback table: {str(e)}")
+        backoff = self.flush_interval
+        while not self._stopping.is_set():
+            self._wakeup.wait(backoff)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                backoff = self.flush_interval
+            except Exception as e:
+                backoff = min(2 * backoff, self.max_backoff)
+                logger.error(f"Error flushing feedback, retrying in {backoff:.0f}s: {str(e)}")
+
+    def close(self, timeout=10):
+        """Stops the worker after a last flush attempt; unflushed records stay in the spool."""
+        self._stopping.set()
+        self._wakeup.set()
+        self._worker.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Feedback left in spool on shutdown: {str(e)}")
+
+
+def create_feedback_queue():
+    settings = llm_config.get('feedback_queue', {})
+    return FeedbackQueue(llm_config.get('feedback_table', 'feedback_store'),
+                         spool_path=settings.get('spool_path', 'feedback_spool.jsonl'),
+                         batch_size=settings.get('batch_size', 32),
+                         flush_interval=settings.get('flush_interval', 2.0))
+
+
+registry.register('feedback_queue', create_feedback_queue, close=lambda queue: queue.close())
 
-# Global variable to store the vector store instance
-vector_store = None
 
 def store_feedback(question, answer, feedback):
     logger.info(f"Storing feedback - Question: {question[:50]}... Feedback: {feedback}")
-    table_name = llm_config.get('feedback_table', 'feedback_store')
-    db = get_vector_store(table_name)
-    if db is None:
-        return False
     try:
-        db.add_texts(
-            texts=[question],
-            metadatas=[{"answer": answer, "feedback": feedback}]
-        )
-        logger.info("Feedback stored successfully")
+        # Spooled locally and written to TiDB by the background worker
+        registry.get('feedback_queue').put(question, answer, feedback)
+        logger.info("Feedback queued successfully")
         return True
     except Exception as e:
         logger.error(f"Error storing feedback: {str(e)}")
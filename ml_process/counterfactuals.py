@@ -1,22 +1,30 @@
 import os
+import sys
 import json
 import numpy as np
 import pandas as pd
 from sklearn.experimental import enable_hist_gradient_boosting  # noqa
 from sklearn.ensemble import HistGradientBoostingClassifier
 import pickle
-import xgboost as xgb
+from pathlib import Path
 import yaml
 import dice_ml
 from dice_ml.utils import helpers
 from sklearn.metrics import pairwise_distances
 
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(root_dir))
+
+from core.inference import make_backend
+
 
 class DiceModelExplainer:
     # Class variables to store the models
     hist_model = None
     dice_model = None
     xgb_model = None
+    inference_backend = None
     explainer = None
     train_categories=None
 
@@ -40,6 +48,7 @@ class DiceModelExplainer:
         if cls.xgb_model is None:
             with open(cls.conf['model']['model_location'], 'rb') as f:
                 cls.xgb_model = pickle.load(f)
+            cls.inference_backend = make_backend(cls.xgb_model, cls.conf['model'].get('inference_backend', 'inplace'))
         # print("yo")
         # if cls.explainer is None:
         #     # Create a DiCE model object using the HistGradientBoostingClassifier model
@@ -132,7 +141,7 @@ class DiceModelExplainer:
             # x1 = query_instance.copy()
             x1 = self.align_categories(self.df.copy())
             x1=x1[self.__class__.xgb_model.feature_names]
-            x1['churn_probability'] = self.__class__.xgb_model.predict(xgb.DMatrix(x1, enable_categorical=True))
+            x1['churn_probability'] = self.__class__.inference_backend.predict(x1)
             x1['type'] = 'actual'
 
 
@@ -140,7 +149,7 @@ class DiceModelExplainer:
             x2=self.catboost_process(x2)
             x2=self.align_categories(x2)
             x2=x2[self.__class__.xgb_model.feature_names]
-            x2['churn_probability'] = self.__class__.xgb_model.predict(xgb.DMatrix(x2, enable_categorical=True))
+            x2['churn_probability'] = self.__class__.inference_backend.predict(x2)
             x2['type'] = 'counterfactual'
 
             ##NOTE - Can add filter_similar_cfs to filter out similar counterfactuals
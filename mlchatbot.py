@@ -27,7 +27,8 @@ if not GOOGLE_API_KEY:
     st.stop()
 
 from utils import walkthrough, sample_questions, normalize_string, remove_sql_and_backticks, agent_prompt, intro_to_data
-from toolbox import generate_sql, execute_sql, subset_churn_contribution_analysis, subset_clv_analysis, generate_visualizations, subset_shap_summary, question_reformer, customer_recommendations, model_stat, VectorDBCreator
+from toolbox import generate_sql, execute_sql, subset_churn_contribution_analysis, subset_clv_analysis, what_if_scenarios, generate_visualizations, subset_shap_summary, question_reformer, customer_recommendations, model_stat
+from core.registry import registry
 from streamlit_utils import add_sidebar_elements, display_chat_history, handle_user_input
 
 # Access the secret
@@ -39,12 +40,11 @@ if not initialize_vector_table():
 else:
     st.success("Vector store initialized successfully.")
 
-# Initialize VectorDBCreator
-try:
-    vector_db = VectorDBCreator()
-except Exception as e:
-    st.error(f"Failed to initialize VectorDBCreator: {str(e)}")
-    vector_db = None
+# Build the clients needed by the first question in the background; the rest stay lazy.
+# Starting the feedback queue early also flushes feedback spooled by a previous run.
+registry.warmup(['vector_db', 'chat2sql', 'feedback_queue'], background=True)
+# Broken clients are found and rebuilt off the request path
+registry.start_health_checks(interval=60)
 
 # Create the Main Agent
 @st.cache_resource
@@ -53,7 +53,7 @@ def get_gen_model():
         return genai.GenerativeModel(
             model_name="gemini-1.5-flash-001",
             system_instruction=agent_prompt(),
-            tools=[generate_sql, execute_sql, subset_churn_contribution_analysis, subset_clv_analysis, generate_visualizations,
+            tools=[generate_sql, execute_sql, subset_churn_contribution_analysis, subset_clv_analysis, what_if_scenarios, generate_visualizations,
                    subset_shap_summary, question_reformer, customer_recommendations, model_stat],
             generation_config={"temperature": 0.3})
     except Exception as e:
@@ -0,0 +1,179 @@
+import os
+import csv
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from tenacity import retry, stop_after_attempt, wait_exponential
+
+logger = logging.getLogger(__name__)
+
+# Row ids are derived from the CSV row number and content, so reruns upsert the same rows
+# instead of duplicating them while duplicate CSV rows still get a row each
+ROW_ID_NAMESPACE = uuid.UUID("0f6e7d1c-4a53-5c2e-9a77-6b1f3c8d2e41")
+
+# Checkpoints are local state, kept out of the data directories (ignored by git)
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bulk_load_checkpoints')
+
+
+def row_id(index, text, metadata):
+    return str(uuid.uuid5(ROW_ID_NAMESPACE, f"{index}\x1f{text}\x1f{json.dumps(metadata, sort_keys=True)}"))
+
+
+def file_digest(path):
+    """SHA-256 of the file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_checkpoint_path(csv_file_path):
+    """One checkpoint per CSV under CHECKPOINT_DIR, told apart by a hash of the CSV's absolute path."""
+    absolute = os.path.abspath(csv_file_path)
+    digest = hashlib.sha1(absolute.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f"{os.path.basename(absolute)}.{digest}.checkpoint.json")
+
+
+class RateLimiter:
+    """Spaces calls evenly so that at most `rate_per_minute` start in any minute, across threads."""
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BulkEmbeddingLoader:
+    """
+    Streams (text, metadata) rows from a CSV, embeds them in batches on a thread
+    pool under a shared rate limit and hands each embedded batch to `write_rows`.
+
+    Progress is checkpointed to a JSON file after every batch as the number of
+    leading CSV rows that are fully written, together with a hash of the CSV, so a
+    rerun after a failure skips them; a checkpoint of a CSV whose content has since
+    changed is discarded and the load starts over. Batches finishing out of order are
+    simply rewritten on a rerun; the row ids (row number and content) make that an
+    idempotent upsert.
+    """
+
+    def __init__(self, embedder, write_rows, batch_size=100, max_workers=4, requests_per_minute=600):
+        """
+        Parameters
+        ----------
+        embedder : Embeddings
+            Model used to embed each batch with one embed_documents call.
+        write_rows : callable
+            Receives a list of (id, embedding, text, metadata) tuples and writes them.
+        batch_size : int
+            Rows per embedding call and per multi-row insert.
+        max_workers : int
+            Batches embedded and written concurrently.
+        requests_per_minute : int
+            Upper bound on embedding calls per minute across all workers.
+        """
+        self.embedder = embedder
+        self.write_rows = write_rows
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_minute)
+
+    @staticmethod
+    def load_checkpoint(checkpoint_path, csv_digest):
+        if os.path.exists(checkpoint_path):
+            try:
+                with open(checkpoint_path, 'r') as f:
+                    checkpoint = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Ignoring unreadable checkpoint {checkpoint_path}: {e}")
+                return 0
+            if checkpoint.get('csv_sha256') != csv_digest:
+                logger.warning(f"Ignoring checkpoint {checkpoint_path}: the CSV has changed since it was written.")
+                return 0
+            return checkpoint.get('rows_done', 0)
+        return 0
+
+    @staticmethod
+    def save_checkpoint(checkpoint_path, rows_done, csv_digest):
+        os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+        tmp_path = checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'rows_done': rows_done, 'csv_sha256': csv_digest, 'updated_at': time.time()}, f)
+        os.replace(tmp_path, checkpoint_path)
+
+    @staticmethod
+    def read_batches(csv_file_path, to_row, batch_size, skip_rows):
+        """Yields (first_row_index, [(index, text, metadata), ...]) without loading the whole file."""
+        with open(csv_file_path, 'r', newline='') as file:
+            batch, start = [], skip_rows
+            for index, record in enumerate(csv.DictReader(file)):
+                if index < skip_rows:
+                    continue
+                batch.append((index, *to_row(record)))
+                if len(batch) == batch_size:
+                    yield start, batch
+                    batch, start = [], index + 1
+            if batch:
+                yield start, batch
+
+    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, max=30), reraise=True)
+    def embed_and_write(self, batch):
+        self.rate_limiter.acquire()
+        texts = [text for _, text, _ in batch]
+        vectors = self.embedder.embed_documents(texts)
+        self.write_rows([(row_id(index, text, metadata), vector, text, metadata)
+                         for (index, text, metadata), vector in zip(batch, vectors)])
+        return len(batch)
+
+    def load(self, csv_file_path, to_row, checkpoint_path=None):
+        """
+        Loads every row of `csv_file_path` not covered by the checkpoint. `to_row` maps a
+        CSV record (dict) to (text, metadata). Returns the total number of rows loaded,
+        including rows loaded by earlier runs. The checkpoint defaults to
+        default_checkpoint_path(csv_file_path).
+        """
+        checkpoint_path = checkpoint_path or default_checkpoint_path(csv_file_path)
+        csv_digest = file_digest(csv_file_path)
+        rows_done = self.load_checkpoint(checkpoint_path, csv_digest)
+        if rows_done:
+            logger.info(f"Resuming after {rows_done} rows already loaded.")
+
+        finished = {}        # first row index -> batch length, for batches done out of order
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def collect(done_futures):
+                nonlocal rows_done
+                for future in done_futures:
+                    start = in_flight.pop(future)
+                    finished[start] = future.result()
+                # Advance the checkpoint over the contiguous prefix of finished batches
+                advanced = False
+                while rows_done in finished:
+                    rows_done += finished.pop(rows_done)
+                    advanced = True
+                if advanced:
+                    self.save_checkpoint(checkpoint_path, rows_done, csv_digest)
+                    logger.info(f"{rows_done} rows loaded.")
+
+            for start, batch in self.read_batches(csv_file_path, to_row, self.batch_size, rows_done):
+                # Bound the batches held in memory while the workers catch up
+                if len(in_flight) >= 2 * self.max_workers:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(self.embed_and_write, batch)] = start
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+        return rows_done
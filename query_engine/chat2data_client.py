@@ -0,0 +1,226 @@
+import time
+import random
+import asyncio
+import httpx
+
+
+class PollBackoff:
+    """
+    Capped exponential backoff with full jitter, bounded by an overall deadline.
+
+    Chat2Data jobs usually finish in a few seconds, so polling starts fast and
+    slows down only for jobs that keep running.
+    """
+
+    def __init__(self, timeout=60, initial=0.25, factor=1.6, maximum=4.0):
+        self.deadline = time.monotonic() + timeout
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.attempt = 0
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def next_delay(self):
+        ceiling = min(self.maximum, self.initial * (self.factor ** self.attempt))
+        self.attempt += 1
+        # Full jitter, but never sleep past the deadline
+        return min(random.uniform(self.initial / 2, ceiling), self.remaining())
+
+
+class AsyncChat2DataClient:
+    """
+    asyncio client for the TiDB Cloud Chat2Data endpoints.
+
+    A single keep-alive `httpx.AsyncClient` is shared by every request, so the
+    TLS handshake and the digest-auth challenge are paid once per client rather
+    than once per call. Job status is polled with `PollBackoff`.
+
+    Use as an async context manager or call `aclose()` when done:
+
+        async with chat2sql.async_client() as client:
+            sql = await client.chat2sql("How many customers churned?")
+    """
+
+    def __init__(self, base_url, public_key, private_key, cluster_id, database,
+                 request_timeout=30.0, max_connections=10, poll_initial=0.25,
+                 poll_factor=1.6, poll_max=4.0):
+        self.cluster_id = cluster_id
+        self.database = database
+        self.summary_url = f"{base_url}/v3/dataSummaries"
+        self.job_status_url = f"{base_url}/v2/jobs"
+        self.chat2data_url = f"{base_url}/v3/chat2data"
+        self.refine_sql_url = f"{base_url}/v3/refineSql"
+        self.poll_initial = poll_initial
+        self.poll_factor = poll_factor
+        self.poll_max = poll_max
+
+        self.session = httpx.AsyncClient(
+            auth=httpx.DigestAuth(public_key, private_key),
+            headers={'Content-Type': 'application/json'},
+            timeout=httpx.Timeout(request_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=120),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.session.aclose()
+
+    def backoff(self, timeout):
+        return PollBackoff(timeout, self.poll_initial, self.poll_factor, self.poll_max)
+
+    async def api_request(self, url, method='GET', data=None):
+        try:
+            if method == 'GET':
+                response = await self.session.get(url)
+            elif method == 'POST':
+                response = await self.session.post(url, json=data)
+            else:
+                raise ValueError(f"Unsupported method: {method}")
+
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            print(f"API request error: {e}")
+            if isinstance(e, httpx.HTTPStatusError):
+                print(f"Error response: {e.response.text}")
+            return None
+
+    async def check_job_status(self, job_id):
+        response = await self.api_request(f"{self.job_status_url}/{job_id}")
+        if response and 'result' in response:
+            return response['result']['status'], response['result'].get('result')
+        print(f"Failed to check job status. Response: {response}")
+        return None, None
+
+    async def wait_for_job(self, job_id, timeout=60):
+        """
+        Polls a job until it is done, failed or the deadline passes.
+
+        Returns the (status, result) pair of the last poll; status is None on timeout.
+        """
+        backoff = self.backoff(timeout)
+        while not backoff.expired():
+            status, result = await self.check_job_status(job_id)
+            if status in ('done', 'failed'):
+                return status, result
+            await asyncio.sleep(backoff.next_delay())
+        print(f"Job {job_id} timed out after {timeout} seconds.")
+        return None, None
+
+    async def generate_data_summary(self, timeout=600):
+        data = {
+            "cluster_id": self.cluster_id,
+            "database": self.database,
+            "description": f"Data summary for {self.database}",
+            "reuse": False
+        }
+        response = await self.api_request(self.summary_url, method='POST', data=data)
+        if not (response and 'result' in response):
+            print("Failed to initiate data summary generation.")
+            return None
+        job_id = response['result']['job_id']
+        status, _ = await self.wait_for_job(job_id, timeout)
+        return job_id if status == 'done' else None
+
+    async def initiate_sql_generation(self, question):
+        data = {
+            "cluster_id": self.cluster_id,
+            "database": self.database,
+            "question": question,
+            "sql_generate_mode": "direct"
+        }
+        response = await self.api_request(self.chat2data_url, method='POST', data=data)
+        if response and 'result' in response:
+            return response['result'].get('job_id')
+        print(f"Failed to initiate SQL generation. Response: {response}")
+        return None
+
+    async def get_generated_sql(self, job_id, timeout=60):
+        status, result = await self.wait_for_job(job_id, timeout)
+        if status == 'done':
+            return result.get('sql')
+        if status == 'failed':
+            print(f"SQL generation failed. Result: {result}")
+        return None
+
+    async def refine_sql(self, sql, instruction):
+        data = {
+            "cluster_id": self.cluster_id,
+            "database": self.database,
+            "sql": sql,
+            "instruction": instruction
+        }
+        response = await self.api_request(self.refine_sql_url, method='POST', data=data)
+        if response and 'result' in response:
+            return response['result'].get('sql')
+        return None
+
+    async def generate_valid_sql(self, question, timeout=60, check_query=None):
+        """
+        Runs one generation attempt: initiate, poll, validate and refine once on failure.
+
+        Returns the validated SQL or None.
+        """
+        query_job_id = await self.initiate_sql_generation(question)
+        if not query_job_id:
+            return None
+
+        generated_sql = await self.get_generated_sql(query_job_id, timeout)
+        if not generated_sql:
+            print("Failed to generate SQL.")
+            return None
+
+        if check_query is None or await asyncio.to_thread(check_query, generated_sql):
+            return generated_sql
+
+        print("SQL check failed. Attempting to refine...")
+        refined_sql = await self.refine_sql(generated_sql, "The previous SQL failed to execute. Please refine it.")
+        if refined_sql and await asyncio.to_thread(check_query, refined_sql):
+            return refined_sql
+        return None
+
+    async def chat2sql(self, question, max_retries=5, timeout=60, check_query=None):
+        """
+        Generates SQL for a question, refining it once per attempt if it fails validation.
+
+        `check_query` is a blocking callable (e.g. `TiDBChat2SQL.check_query`); it is run
+        in a worker thread so the event loop keeps serving other jobs.
+        """
+        for attempt in range(max_retries):
+            print(f"Generating SQL (Attempt {attempt + 1}/{max_retries})...")
+            sql = await self.generate_valid_sql(question, timeout, check_query)
+            if sql:
+                return sql
+
+        print(f"Failed to generate valid SQL after {max_retries} attempts.")
+        return None
+
+    async def speculative_chat2sql(self, question, parallel=3, timeout=60, check_query=None):
+        """
+        Launches `parallel` generation attempts at once and returns the first SQL that
+        passes `check_query`. The remaining attempts are cancelled.
+        """
+        tasks = [asyncio.create_task(self.generate_valid_sql(question, timeout, check_query))
+                 for _ in range(parallel)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                sql = await next_done
+                if sql:
+                    return sql
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from pymysql.constants import FIELD_TYPE
+
+INTEGER_TYPES = {FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, FIELD_TYPE.LONGLONG,
+                 FIELD_TYPE.INT24, FIELD_TYPE.YEAR}
+FLOAT_TYPES = {FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE, FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL}
+DATETIME_TYPES = {FIELD_TYPE.DATE, FIELD_TYPE.NEWDATE, FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP}
+STRING_TYPES = {FIELD_TYPE.VARCHAR, FIELD_TYPE.VAR_STRING, FIELD_TYPE.STRING, FIELD_TYPE.ENUM,
+                FIELD_TYPE.SET, FIELD_TYPE.TINY_BLOB, FIELD_TYPE.MEDIUM_BLOB, FIELD_TYPE.LONG_BLOB,
+                FIELD_TYPE.BLOB}
+
+
+def _float_column(values, n):
+    return np.fromiter((np.nan if v is None else float(v) for v in values), dtype=np.float64, count=n)
+
+
+def column_from_values(type_code, values, categorical_ratio=0.5):
+    """
+    Builds a typed array for one result column from its MySQL type code.
+
+    Integers become int64 (float64 when NULLs are present), DECIMAL/FLOAT/DOUBLE
+    become float64, dates become datetime64 and strings are dictionary encoded as
+    pandas Categoricals when the share of distinct values is at most
+    `categorical_ratio`. Anything else is left as Python objects.
+    """
+    n = len(values)
+    if type_code in INTEGER_TYPES:
+        if any(v is None for v in values):
+            return _float_column(values, n)
+        return np.fromiter(values, dtype=np.int64, count=n)
+    if type_code in FLOAT_TYPES:
+        return _float_column(values, n)
+    if type_code in DATETIME_TYPES:
+        return pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').values
+    if type_code in STRING_TYPES:
+        categorical = pd.Categorical(values)
+        if len(categorical.categories) <= max(1, categorical_ratio * n):
+            return categorical
+    return np.array(values, dtype=object)
+
+
+def frame_from_rows(description, rows, categorical_ratio=0.5):
+    """
+    Builds a DataFrame column by column using the DB-API cursor `description`
+    instead of letting pandas infer dtypes from row tuples of Python objects.
+    """
+    names = [column[0] for column in description]
+    if not rows:
+        return pd.DataFrame(columns=names)
+    columns = list(zip(*rows))
+    data = {}
+    for index, column in enumerate(description):
+        data[index] = column_from_values(column[1], columns[index], categorical_ratio)
+    df = pd.DataFrame(data, copy=False)
+    # Assigned afterwards so duplicated column names (e.g. from SELECT a.*, b.*) survive
+    df.columns = names
+    return df
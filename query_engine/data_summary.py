@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import asyncio
+import threading
+
+
+class DataSummaryManager:
+    """
+    Keeps the Chat2Data data summary current without blocking callers.
+
+    The schema is fingerprinted (see SchemaCatalog.fingerprint) and a new summary is
+    generated in the background only when the fingerprint changes. Until the new
+    summary job is done, the previous job id keeps being served. The job id and the
+    fingerprint it was built from are persisted in `config_file`.
+    """
+
+    def __init__(self, catalog, submit_async, async_client, config_file, check_interval=600):
+        """
+        Parameters
+        ----------
+        catalog : SchemaCatalog
+            Source of the schema fingerprint.
+        submit_async : callable
+            Schedules a coroutine on a running event loop and returns a concurrent Future.
+        async_client : callable
+            Returns the AsyncChat2DataClient living on that loop.
+        config_file : str
+            JSON file holding the current job id and fingerprint.
+        check_interval : int
+            Minimum seconds between two fingerprint checks triggered by maybe_refresh.
+        """
+        self.catalog = catalog
+        self.submit_async = submit_async
+        self.async_client = async_client
+        self.config_file = config_file
+        self.check_interval = check_interval
+
+        config = self.load_config()
+        self.job_id = config.get('data_summary_job_id')
+        self.fingerprint = config.get('schema_fingerprint')
+        self.last_check = 0.0
+        self._refresh_future = None
+        self._lock = threading.Lock()
+
+    def load_config(self):
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Ignoring unreadable data summary config: {e}")
+        return {}
+
+    def save_config(self):
+        tmp_file = self.config_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'data_summary_job_id': self.job_id, 'schema_fingerprint': self.fingerprint}, f)
+        os.replace(tmp_file, self.config_file)
+
+    def refresh_async(self, force=False):
+        """
+        Starts a background check (and regeneration if the schema changed) unless one
+        is already running. Returns the concurrent Future of the running check.
+        """
+        with self._lock:
+            if self._refresh_future is None or self._refresh_future.done():
+                self.last_check = time.monotonic()
+                self._refresh_future = self.submit_async(self._refresh(force))
+            return self._refresh_future
+
+    def maybe_refresh(self):
+        """Starts a background check if the last one is older than check_interval."""
+        if time.monotonic() - self.last_check >= self.check_interval:
+            self.refresh_async()
+
+    async def _refresh(self, force):
+        try:
+            fingerprint = await asyncio.to_thread(self.catalog.fingerprint)
+            if not force and self.job_id and self.fingerprint is None:
+                # Summary saved before fingerprints were tracked: adopt it as current
+                self.fingerprint = fingerprint
+                await asyncio.to_thread(self.save_config)
+                return self.job_id
+            if not force and self.job_id and fingerprint == self.fingerprint:
+                print("Data summary is up to date.")
+                return self.job_id
+
+            print("Schema changed or no data summary found. Generating a new data summary in the background...")
+            job_id = await self.async_client().generate_data_summary()
+            if job_id:
+                # Swap only once the new summary is ready
+                self.job_id, self.fingerprint = job_id, fingerprint
+                await asyncio.to_thread(self.save_config)
+                print(f"Data summary updated. Job ID: {job_id}")
+            else:
+                print("Data summary generation failed. Keeping the previous summary.")
+            return self.job_id
+        except Exception as e:
+            print(f"Data summary refresh failed: {e}")
+            return self.job_id
@@ -0,0 +1,185 @@
+import os
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+DEFAULT_PERSIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embedding_cache.sqlite')
+
+
+class EmbeddingCache:
+    """
+    Content-hashed cache of embedding vectors shared by every caller in the process.
+
+    Vectors are keyed on the model, the kind of embedding (query or document, which
+    the Google models embed with different task types) and the exact text. The
+    in-memory LRU holds up to `max_entries` vectors; with `persist_path` set, vectors
+    are also kept in SQLite (bounded by `max_disk_entries`) so they survive restarts
+    and are shared by worker processes on the host. Hits and misses are recorded per
+    caller.
+    """
+
+    def __init__(self, embedder, model_name, max_entries=10000, persist_path=None, max_disk_entries=100000):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.conn = None
+        if persist_path:
+            self.conn = sqlite3.connect(persist_path, check_same_thread=False, timeout=10)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    cache_key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+            self.conn.commit()
+
+    def make_key(self, kind, text):
+        raw = f"{self.model_name}\x1f{kind}\x1f{text}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def embed(self, texts, kind, caller):
+        """
+        Returns one vector per text, computing only the ones not cached yet (each
+        distinct text once) in a single call to the underlying model.
+        """
+        keys = [self.make_key(kind, t) for t in texts]
+        found = {}
+        disk_hits = 0
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            missing = [k for k in dict.fromkeys(keys) if k not in found]
+            if missing and self.conn is not None:
+                for key, vector in self._read_disk(missing).items():
+                    found[key] = vector
+                    self._remember(key, vector)
+                    disk_hits += 1
+
+        pending = {}
+        for key, t in zip(keys, texts):
+            if key not in found:
+                pending.setdefault(key, t)
+        if pending:
+            if kind == 'query':
+                vectors = [self.embedder.embed_query(t) for t in pending.values()]
+            else:
+                vectors = self.embedder.embed_documents(list(pending.values()))
+            computed = dict(zip(pending, vectors))
+            found.update(computed)
+            with self._lock:
+                for key, vector in computed.items():
+                    self._remember(key, vector)
+                if self.conn is not None:
+                    self._write_disk(computed)
+
+        with self._lock:
+            stats = self._stats.setdefault(caller, {"hits": 0, "misses": 0, "disk_hits": 0})
+            stats["misses"] += sum(1 for key in keys if key in pending)
+            stats["hits"] += sum(1 for key in keys if key not in pending)
+            stats["disk_hits"] += disk_hits
+        return [list(found[key]) for key in keys]
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, keys):
+        vectors = {}
+        now = time.time()
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = self.conn.execute(
+                f"SELECT cache_key, vector FROM embeddings WHERE cache_key IN ({placeholders})", chunk).fetchall()
+            for key, blob in rows:
+                vectors[key] = array.array('d', blob).tolist()
+        if vectors:
+            self.conn.executemany("UPDATE embeddings SET last_access = ? WHERE cache_key = ?",
+                                  [(now, key) for key in vectors])
+            self.conn.commit()
+        return vectors
+
+    def _write_disk(self, vectors):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+            [(key, array.array('d', vector).tobytes(), now) for key, vector in vectors.items()])
+        self.conn.execute("""
+            DELETE FROM embeddings WHERE cache_key IN (
+                SELECT cache_key FROM embeddings ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_disk_entries,))
+        self.conn.commit()
+
+    def for_caller(self, caller):
+        """Returns an Embeddings view of this cache whose lookups are counted under `caller`."""
+        return CachedEmbeddings(self, caller)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM embeddings")
+                self.conn.commit()
+
+    def stats(self):
+        """Returns hits, misses and hit rate per caller, plus the number of cached vectors."""
+        with self._lock:
+            callers = {}
+            for caller, stats in self._stats.items():
+                lookups = stats["hits"] + stats["misses"]
+                callers[caller] = {**stats, "hit_rate": stats["hits"] / lookups if lookups else 0.0}
+            return {"memory_entries": len(self._memory), "callers": callers}
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings backed by a shared EmbeddingCache, usable as any vector store's embedding function."""
+
+    def __init__(self, cache, caller):
+        self.cache = cache
+        self.caller = caller
+
+    def embed_documents(self, texts):
+        return self.cache.embed(list(texts), 'document', self.caller)
+
+    def embed_query(self, text):
+        return self.cache.embed([text], 'query', self.caller)[0]
+
+
+_caches = {}
+_lock = threading.Lock()
+
+
+def get_cached_embeddings(model, google_api_key, caller, persist_path=DEFAULT_PERSIST_PATH, max_entries=10000):
+    """
+    Returns embeddings for `model` that go through the process-wide cache for that
+    model, counting lookups under `caller`. The cache is created on first use; later
+    calls share it regardless of `persist_path` and `max_entries`.
+    """
+    with _lock:
+        if model not in _caches:
+            embedder = GoogleGenerativeAIEmbeddings(model=model, google_api_key=google_api_key)
+            _caches[model] = EmbeddingCache(embedder, model, max_entries=max_entries, persist_path=persist_path)
+        return _caches[model].for_caller(caller)
+
+
+def embedding_cache_stats():
+    """Returns the stats of every shared embedding cache, keyed by model."""
+    return {model: cache.stats() for model, cache in list(_caches.items())}
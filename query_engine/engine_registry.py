@@ -0,0 +1,135 @@
+import time
+import threading
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Tuned for TiDB Serverless: small pools (the cluster caps connections), pre-ping
+# because idle connections are dropped server side, and recycling well before that
+DEFAULT_POOL_SETTINGS = {
+    "pool_size": 5,
+    "max_overflow": 5,
+    "pool_timeout": 30,
+    "pool_pre_ping": True,
+    "pool_recycle": 300,
+}
+
+
+class PoolMetrics:
+    """Counters and timings collected by InstrumentedQueuePool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
+        self.connects = 0
+        self.connect_seconds = 0.0
+        self.max_connect_seconds = 0.0
+
+    def record_checkout(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            self.max_checkout_seconds = max(self.max_checkout_seconds, seconds)
+
+    def record_connect(self, seconds):
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds += seconds
+            self.max_connect_seconds = max(self.max_connect_seconds, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "avg_checkout_wait_ms": 1000 * self.checkout_seconds / self.checkouts if self.checkouts else 0.0,
+                "max_checkout_wait_ms": 1000 * self.max_checkout_seconds,
+                "connects": self.connects,
+                "avg_connect_ms": 1000 * self.connect_seconds / self.connects if self.connects else 0.0,
+                "max_connect_ms": 1000 * self.max_connect_seconds,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that times how long callers wait for a connection (including any new
+    connection it has to open) and how long opening a connection takes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.metrics.record_checkout(time.perf_counter() - start)
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        record = super()._create_connection()
+        self.metrics.record_connect(time.perf_counter() - start)
+        return record
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def get_engine(dsn, **pool_settings):
+    """
+    Returns the process-wide engine for a DSN, creating it on first use.
+
+    `pool_settings` override DEFAULT_POOL_SETTINGS and only apply when the engine is
+    first created.
+    """
+    engine = _engines.get(dsn)
+    if engine is not None:
+        return engine
+    with _lock:
+        if dsn not in _engines:
+            _engines[dsn] = create_engine(dsn, poolclass=InstrumentedQueuePool,
+                                          **{**DEFAULT_POOL_SETTINGS, **pool_settings})
+        return _engines[dsn]
+
+
+def shared_engine_args(dsn):
+    """
+    Engine arguments for a client-built engine (e.g. the TiDBVectorStore's) on the
+    same DSN, so that it holds no pool of its own: every connection it opens is
+    checked out of the registry engine's pool, and closing it hands it back there.
+    Whatever clients a process builds, it keeps one pool per DSN, and pool_metrics
+    covers their traffic. (A Pool instance itself cannot be passed to another engine,
+    since SQLAlchemy binds the dialect and its first-connect setup to each pool.)
+    """
+    engine = get_engine(dsn)
+    return {"creator": engine.raw_connection, "poolclass": NullPool}
+
+
+def pool_metrics():
+    """Returns pool status and timings for every registered engine, keyed by DSN with the password hidden."""
+    metrics = {}
+    for dsn, engine in list(_engines.items()):
+        pool = engine.pool
+        metrics[make_url(dsn).render_as_string(hide_password=True)] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            **pool.metrics.snapshot(),
+        }
+    return metrics
+
+
+def dispose_all():
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
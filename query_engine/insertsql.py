@@ -2,8 +2,9 @@ import os
 import csv
 import json
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from urllib.parse import quote_plus
+from query_engine.engine_registry import get_engine
 
 class CounterfactualRecommendationsImporter:
     def __init__(self):
@@ -33,7 +34,7 @@ class CounterfactualRecommendationsImporter:
 
         connection_string += "ssl_verify_cert=true&ssl_verify_identity=true"
 
-        return create_engine(connection_string)
+        return get_engine(connection_string)
 
     def create_table(self):
         with self.engine.connect() as connection:
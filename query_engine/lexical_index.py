@@ -0,0 +1,110 @@
+import re
+import math
+from collections import Counter
+
+# Literals that vary between otherwise identical questions: quoted strings, numbers and ids
+LITERAL_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"|\b\d+(?:[.,]\d+)*%?")
+WORD_PATTERN = re.compile(r"<lit>|[a-z0-9_]+")
+STOP_WORDS = {'the', 'a', 'an', 'of', 'for', 'to', 'in', 'on', 'is', 'are', 'what', 'me', 'show', 'give', 'please'}
+
+
+def mask_literals(question):
+    """Lower-cases a question and replaces every literal with the same <lit> token."""
+    return LITERAL_PATTERN.sub(' <lit> ', question.lower())
+
+
+def tokenize(question):
+    return [t for t in WORD_PATTERN.findall(mask_literals(question)) if t not in STOP_WORDS]
+
+
+class LexicalIndex:
+    """
+    In-process BM25 index over known-good questions with literals masked, so that
+    "churn rate for customer 3000026" and "churn rate for customer 3000031" are the
+    same text to the index.
+
+    `search` also returns a similarity in [0, 1]: the query's BM25 score divided by
+    the score the matched question gets against itself, scaled down when the words
+    come in a different order (the share of word bigrams the two have in common).
+    Query terms repeated more often than in the question count as extra terms. A
+    similarity of 1 means the query is the stored question with (at most)
+    different literals.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        """
+        Parameters
+        ----------
+        documents : list of (str, dict)
+            (question, metadata) pairs.
+        k1, b : float
+            BM25 term-frequency saturation and length normalization.
+        """
+        self.documents = [question for question, _ in documents]
+        self.metadatas = [metadata for _, metadata in documents]
+        self.k1 = k1
+        self.b = b
+        tokens = [tokenize(question) for question in self.documents]
+        self.term_counts = [Counter(terms) for terms in tokens]
+        self.bigram_counts = [Counter(zip(terms, terms[1:])) for terms in tokens]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        n = len(self.documents)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+        self.postings = {}
+        for i, counts in enumerate(self.term_counts):
+            for term in counts:
+                self.postings.setdefault(term, []).append(i)
+        self.self_scores = [self._score(counts, i) for i, counts in enumerate(self.term_counts)]
+
+    def __len__(self):
+        return len(self.documents)
+
+    def _score(self, query_counts, i):
+        counts = self.term_counts[i]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.average_length)
+        score = 0.0
+        for term, query_frequency in query_counts.items():
+            frequency = counts.get(term)
+            if frequency:
+                # Repeating a term in the query does not make it match better
+                score += min(query_frequency, frequency) * self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+        return score
+
+    @staticmethod
+    def _order_agreement(query_bigrams, bigrams):
+        longest = max(sum(query_bigrams.values()), sum(bigrams.values()))
+        if not longest:
+            return 1.0
+        return sum((query_bigrams & bigrams).values()) / longest
+
+    def search(self, query, k=3):
+        """Returns up to k (index, bm25_score, similarity) tuples, best first."""
+        terms = tokenize(query)
+        query_counts = Counter(terms)
+        query_bigrams = Counter(zip(terms, terms[1:]))
+        candidates = {i for term in query_counts for i in self.postings.get(term, ())}
+        scored = []
+        for i in candidates:
+            score = self._score(query_counts, i)
+            # Query terms the question lacks, or has fewer times, make it a weaker match
+            counts = self.term_counts[i]
+            extra = sum(max(0, frequency - counts.get(t, 0)) * self.idf.get(t, 0.0) for t, frequency in query_counts.items())
+            similarity = score / (self.self_scores[i] + extra) if self.self_scores[i] else 0.0
+            similarity *= 0.5 + 0.5 * self._order_agreement(query_bigrams, self.bigram_counts[i])
+            scored.append((i, score, min(similarity, 1.0)))
+        scored.sort(key=lambda hit: (-hit[1], -hit[2]))
+        return scored[:k]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses several rankings (lists of keys, best first) into one: each key scores
+    sum(1 / (k + rank)) over the rankings it appears in. Returns keys, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda key: -scores[key])
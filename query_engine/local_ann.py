@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+from sqlalchemy import text
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+
+# Tabs and line breaks count as spaces, as in the question_hash column
+_WHITESPACE_TO_SPACE = str.maketrans('\t\n\r', '   ')
+
+
+def normalize_question(question):
+    # Same normalization as the question_hash column (sqlknowledgebase.question_hash_sql)
+    return question.translate(_WHITESPACE_TO_SPACE).strip(' ').lower()
+
+
+class _Snapshot:
+    """Immutable view of the index that searches run against while a sync builds the next one."""
+
+    def __init__(self, ids, documents, metadatas, matrix, backend):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.matrix = matrix
+        self.position = {row_id: i for i, row_id in enumerate(ids)}
+        self.exact = {normalize_question(doc): i for i, doc in enumerate(documents)}
+        self.hnsw = None
+        if backend == 'hnsw' and len(ids):
+            self.hnsw = hnswlib.Index(space='cosine', dim=matrix.shape[1])
+            self.hnsw.init_index(max_elements=len(ids), ef_construction=200, M=16)
+            self.hnsw.add_items(np.asarray(matrix), np.arange(len(ids)))
+            self.hnsw.set_ef(64)
+
+
+class LocalANNIndex:
+    """
+    In-process mirror of a TiDBVectorStore table for nearest-neighbour search
+    without a network round trip. TiDB stays the source of truth.
+
+    Vectors are kept L2-normalized in a float32 matrix that is persisted as .npy and
+    memory-mapped on load, so cosine distance is one matrix-vector product (or an
+    HNSW lookup when hnswlib is installed and `backend='hnsw'`). `sync` pulls only
+    rows whose update_time moved past the last seen watermark; a change in row count
+    that the increment does not explain (deletes) triggers a full reload.
+    """
+
+    def __init__(self, engine, table_name, index_dir, backend='numpy', sync_interval=300):
+        """
+        Parameters
+        ----------
+        engine : sqlalchemy.Engine
+            Engine for the database holding `table_name`.
+        table_name : str
+            TiDBVectorStore table (id, embedding, document, meta, update_time) to mirror.
+        index_dir : str
+            Directory for the persisted vectors and row metadata.
+        backend : str
+            'numpy' for exact brute-force search, 'hnsw' for hnswlib (falls back to numpy if missing).
+        sync_interval : int
+            Minimum seconds between two background syncs started by maybe_sync.
+        """
+        if backend == 'hnsw' and hnswlib is None:
+            logger.warning("hnswlib is not installed; the local ANN index falls back to NumPy search.")
+            backend = 'numpy'
+        self.engine = engine
+        self.table_name = table_name
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.vectors_path = os.path.join(index_dir, f"{table_name}.npy")
+        self.rows_path = os.path.join(index_dir, f"{table_name}.rows.json")
+        os.makedirs(index_dir, exist_ok=True)
+
+        self.watermark = None
+        self.last_sync = 0.0
+        self._snapshot = None
+        self._sync_lock = threading.Lock()
+        self._sync_thread = None
+        self.load()
+
+    @property
+    def ready(self):
+        return self._snapshot is not None
+
+    def __len__(self):
+        return len(self._snapshot.ids) if self._snapshot else 0
+
+    def load(self):
+        """Loads the persisted index, memory-mapping the vectors. Returns False if there is none."""
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.rows_path)):
+            return False
+        try:
+            with open(self.rows_path, 'r') as f:
+                rows = json.load(f)
+            matrix = np.load(self.vectors_path, mmap_mode='r')
+            self._snapshot = _Snapshot(rows['ids'], rows['documents'], rows['metadatas'], matrix, self.backend)
+            self.watermark = rows.get('watermark')
+            logger.info(f"Loaded local ANN index for {self.table_name} with {len(self)} rows.")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to load local ANN index: {e}")
+            return False
+
+    def save(self, snapshot):
+        tmp_vectors = self.vectors_path + '.tmp.npy'
+        tmp_rows = self.rows_path + '.tmp'
+        np.save(tmp_vectors, np.asarray(snapshot.matrix))
+        with open(tmp_rows, 'w') as f:
+            json.dump({'ids': snapshot.ids, 'documents': snapshot.documents,
+                       'metadatas': snapshot.metadatas, 'watermark': self.watermark}, f)
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_rows, self.rows_path)
+
+    @staticmethod
+    def _parse_row(embedding, meta):
+        if isinstance(embedding, (str, bytes)):
+            embedding = json.loads(embedding)
+        if isinstance(meta, (str, bytes)):
+            meta = json.loads(meta)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector), (meta or {})
+
+    def sync(self, full=False):
+        """
+        Brings the mirror up to date with the table. Returns the number of rows
+        added or updated.
+        """
+        with self._sync_lock:
+            changed = self._sync(full)
+            if changed is None:
+                logger.info("Row count drifted from the local ANN index (deleted rows); reloading it fully.")
+                changed = self._sync(full=True)
+            self.last_sync = time.monotonic()
+            return changed
+
+    def _sync(self, full):
+        snapshot = None if full else self._snapshot
+        watermark = None if snapshot is None else self.watermark
+        query = f"SELECT id, embedding, document, meta, update_time FROM {self.table_name}"
+        params = {}
+        if watermark is not None:
+            # >= so rows sharing the watermark second are not missed; they are just re-read
+            query += " WHERE update_time >= :watermark"
+            params["watermark"] = watermark
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(query + " ORDER BY update_time"), params).fetchall()
+            total_rows = connection.execute(text(f"SELECT COUNT(*) FROM {self.table_name}")).scalar()
+
+        ids = list(snapshot.ids) if snapshot else []
+        documents = list(snapshot.documents) if snapshot else []
+        metadatas = list(snapshot.metadatas) if snapshot else []
+        position = dict(snapshot.position) if snapshot else {}
+        replaced, appended = {}, []
+        for row_id, embedding, document, meta, updated in rows:
+            vector, meta = self._parse_row(embedding, meta)
+            watermark = str(updated)
+            if row_id in position:
+                i = position[row_id]
+                if documents[i] == document and metadatas[i] == meta and np.array_equal(snapshot.matrix[i], vector):
+                    # Re-read because it shares the watermark timestamp, but unchanged
+                    continue
+                documents[i], metadatas[i] = document, meta
+                replaced[i] = vector
+            else:
+                position[row_id] = len(ids)
+                ids.append(row_id)
+                documents.append(document)
+                metadatas.append(meta)
+                appended.append(vector)
+
+        if snapshot is not None and len(ids) != total_rows:
+            return None
+        if snapshot is not None and not replaced and not appended:
+            return 0
+
+        matrix = np.array(snapshot.matrix, dtype=np.float32) if snapshot else None
+        for i, vector in replaced.items():
+            matrix[i] = vector
+        if appended:
+            matrix = np.vstack([matrix, *appended]) if matrix is not None and len(matrix) else np.vstack(appended)
+        if matrix is None:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        new_snapshot = _Snapshot(ids, documents, metadatas, matrix, self.backend)
+        self.watermark = watermark
+        self.save(new_snapshot)
+        self._snapshot = new_snapshot
+        logger.info(f"Local ANN index for {self.table_name} synced: "
+                    f"{len(replaced) + len(appended)} rows changed, {len(ids)} total.")
+        return len(replaced) + len(appended)
+
+    def maybe_sync(self):
+        """Starts a background sync if the last one is older than sync_interval and none is running."""
+        if time.monotonic() - self.last_sync < self.sync_interval:
+            return
+        if self._sync_thread is not None and self._sync_thread.is_alive():
+            return
+        self.last_sync = time.monotonic()
+        self._sync_thread = threading.Thread(target=self._background_sync, name="local-ann-sync", daemon=True)
+        self._sync_thread.start()
+
+    def _background_sync(self):
+        try:
+            self.sync()
+        except Exception as e:
+            logger.warning(f"Local ANN sync failed: {e}")
+
+    def exact_match(self, question):
+        """Returns the metadata of the row whose document equals `question` (case and spaces ignored), or None."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        i = snapshot.exact.get(normalize_question(question))
+        return None if i is None else snapshot.metadatas[i]
+
+    def search(self, query_vector, k=3):
+        """Returns up to k (document, metadata, cosine_distance) tuples, nearest first."""
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.ids:
+            return []
+        k = min(k, len(snapshot.ids))
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        if snapshot.hnsw is not None:
+            labels, distances = snapshot.hnsw.knn_query(query, k=k)
+            hits = zip(labels[0].tolist(), distances[0].tolist())
+        else:
+            similarities = snapshot.matrix @ query
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            hits = ((i, 1.0 - float(similarities[i])) for i in top)
+        return [(snapshot.documents[i], snapshot.metadatas[i], distance) for i, distance in hits]
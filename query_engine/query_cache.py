@@ -0,0 +1,76 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class QueryResultCache:
+    """
+    In-process LRU cache of query results (pandas DataFrames), bounded by total bytes.
+
+    Entries are keyed on the SQL fingerprint and remember the versions of the tables
+    they were read from; an entry is only served while those versions are unchanged
+    and it is younger than `ttl_seconds`. Cached frames are copied on the way out
+    because the analysis tools modify the frames they receive.
+
+    Table versions come from INFORMATION_SCHEMA, which TiDB updates lazily, so small
+    writes may not change them; `ttl_seconds` is therefore kept short and bounds how
+    stale a served result can be.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl_seconds=30):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, table_versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                df, nbytes, versions, created_at = entry
+                if versions == table_versions and time.monotonic() - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return df.copy()
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, table_versions, df):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (df.copy(), nbytes, table_versions, time.monotonic())
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, nbytes, _, _ = self._entries.pop(key)
+        self.current_bytes -= nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+            }
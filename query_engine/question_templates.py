@@ -0,0 +1,140 @@
+import re
+from decimal import Decimal, InvalidOperation
+from query_engine.sqlutils import CLAUSE_KEYWORDS, TOKEN_PATTERN, identifier_name
+
+# Quoted strings, ISO dates and numbers (ids, counts, amounts) in a natural-language question
+QUESTION_LITERAL_PATTERN = re.compile(r"""'([^']*)'|"([^"]*)"|\b(\d{4}-\d{2}-\d{2})\b|(?<![\w.])(\d+(?:\.\d+)?)(?![\w.]*[a-zA-Z_])""")
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+PLACEHOLDER = "<lit>"
+
+# Tokens that may sit between a column and its value: IN / BETWEEN lists, NOT, LIKE, IS
+PREDICATE_LINKS = {'in', 'not', 'like', 'between', 'and', 'is'}
+# Keywords that end the search for a literal's column (LIMIT 10, OFFSET 20, THEN 1, ...)
+NOT_COLUMNS = CLAUSE_KEYWORDS | {'offset', 'top', 'case', 'when', 'then', 'else', 'end', 'by', 'interval', 'or'}
+EQUALITY = {'=', '!=', '<>', '<=>'}
+
+
+def marker(index):
+    return f"{{{{lit{index}}}}}"
+
+
+def extract_literals(question):
+    """
+    Splits a question into a template and its literals.
+
+    >>> extract_literals("Recommendations for customer_id 3334558")
+    ('recommendations for customer_id <lit>', ['3334558'])
+    """
+    literals = []
+
+    def replace(match):
+        literals.append(next(group for group in match.groups() if group is not None))
+        return PLACEHOLDER
+
+    template = QUESTION_LITERAL_PATTERN.sub(replace, question)
+    template = re.sub(r'\s+', ' ', template.lower()).strip().rstrip('?.!; ')
+    return template, literals
+
+
+def _same_value(literal, kind, token):
+    if kind == 'number':
+        try:
+            return Decimal(literal) == Decimal(token)
+        except InvalidOperation:
+            return False
+    if kind == 'string':
+        quote = token[0]
+        return token[1:-1].replace(quote * 2, quote).replace('\\' + quote, quote) == literal
+    return False
+
+
+def _predicate(previous):
+    """
+    Returns (column, operator) for a literal from the significant tokens before it:
+    the column it is compared with (None when there is none, e.g. LIMIT 10) and the
+    nearest operator.
+    """
+    operator = None
+    for kind, value in reversed(previous):
+        if kind == 'op':
+            operator = operator or value
+            continue
+        if kind in ('number', 'string') or (kind == 'punct' and value in '(),'):
+            continue
+        name = identifier_name(kind, value)
+        if name in PREDICATE_LINKS:
+            continue
+        return (None if name in NOT_COLUMNS else name), operator
+    return None, operator
+
+
+def _mentioned(column, question):
+    """True when the question names the column, e.g. customer_id in "customer 3334558" or monthlyrevenue in "monthly revenue"."""
+    words = {word.rstrip('s') for word in re.findall(r"[a-z0-9]+", question.lower())}
+    compact = re.sub(r"[^a-z0-9]", "", question.lower())
+    parts = [part.rstrip('s') for part in column.split('_') if len(part) >= 3]
+    return column.replace('_', '').rstrip('s') in compact or any(part in words for part in parts)
+
+
+def parameterize_sql(sql, literals, question):
+    """
+    Replaces the SQL literals that carry the question's literals with markers.
+
+    Only a literal compared with a column the question names can carry a question
+    literal; 0/1 flag comparisons (`churn = 1`) and literals outside a predicate
+    (`LIMIT 10`) never do. Returns None when the SQL cannot be safely templated: a
+    question literal is not carried by exactly one such SQL literal, or two
+    question literals share the same value. Otherwise an unrelated SQL literal
+    could be rebound (e.g. "more than 1 year" and `months > 12 AND churn = 1`),
+    changing the query.
+    """
+    if not literals or len(set(literals)) != len(literals):
+        return None
+    found = set()
+    parts, position = [], 0
+    previous = []
+    for match in TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind in ('space', 'comment'):
+            continue
+        token = match.group()
+        column, operator = _predicate(previous) if kind in ('number', 'string') else (None, None)
+        previous.append((kind, token))
+        if kind not in ('number', 'string') or column is None or not _mentioned(column, question):
+            continue
+        if kind == 'number' and operator in EQUALITY and (_same_value('0', kind, token) or _same_value('1', kind, token)):
+            continue
+        matches = [i for i, literal in enumerate(literals) if _same_value(literal, kind, token)]
+        if not matches:
+            continue
+        index = matches[0]
+        if index in found:
+            return None
+        found.add(index)
+        # String markers keep their quotes out of the template; binding re-quotes them
+        parts.append(sql[position:match.start()])
+        parts.append(marker(index) if kind == 'number' else "'" + marker(index) + "'")
+        position = match.end()
+    if len(found) != len(literals):
+        return None
+    parts.append(sql[position:])
+    return ''.join(parts)
+
+
+def bind_sql(sql_template, literals):
+    """
+    Binds new literals into a template produced by parameterize_sql. Returns None if
+    a literal does not fit its slot (e.g. text where the SQL expects a number).
+    """
+    sql = sql_template
+    for index, literal in enumerate(literals):
+        quoted_marker = "'" + marker(index) + "'"
+        if quoted_marker in sql:
+            sql = sql.replace(quoted_marker, "'" + literal.replace("\\", "\\\\").replace("'", "''") + "'")
+        if marker(index) in sql:
+            if not NUMBER_PATTERN.fullmatch(literal):
+                return None
+            sql = sql.replace(marker(index), literal)
+    if re.search(r"\{\{lit\d+\}\}", sql):
+        return None
+    return sql
@@ -0,0 +1,308 @@
+"""
+Offline benchmark for question retrieval (knowledge-base and feedback lookups).
+
+Runs against a local NumPy stand-in for the TiDB vector store. It reports:
+
+- recall@k of paraphrased questions against their source question,
+- precision and coverage of the top hit at each distance threshold (including
+  out-of-domain questions that should not match anything), to justify cut-offs
+  such as `similarity < 0.2` in toolbox.generate_sql and the answer cache tiers,
+- p50/p99 lookup latency as the index grows with distractor entries.
+
+With --embedder google, recall, precision and coverage come from the production
+embedding model through the shared embedding cache (query_engine/embedding_cache.py),
+whose SQLite file keeps the vectors, so only the first run needs the network.
+Distances of the default deterministic hashed n-gram embedder are not comparable
+with the production model's (its top hits rarely fall under the production
+thresholds); use it for latency scaling, which is also what the google runs use
+it for, since embedding a million distractors through the API is not practical.
+Rerun with --csv on the real known-good SQL file for a realistic corpus.
+
+    python -m query_engine.retrieval_benchmark --embedder google --csv data/telecom_churn/known_good_sqlbase.csv
+    python -m query_engine.retrieval_benchmark --sizes 1000 10000 100000 1000000
+"""
+import os
+import re
+import csv
+import time
+import zlib
+import argparse
+import numpy as np
+import yaml
+
+# (question, sql, paraphrases)
+FIXTURE = [
+    ("What is the average monthly revenue for customers who have churned?",
+     "SELECT AVG(monthlyrevenue) FROM customer_data WHERE churn = 'Yes'",
+     ["Average monthly revenue of churned customers",
+      "How much monthly revenue do churned customers bring in on average?",
+      "mean monthly revenue for customers that churned"]),
+    ("How many customers have churned?",
+     "SELECT COUNT(*) FROM customer_data WHERE churn = 'Yes'",
+     ["Count of churned customers",
+      "What is the number of customers who churned?",
+      "how many churned customers are there"]),
+    ("What is the churn rate by credit rating?",
+     "SELECT creditrating, AVG(churn = 'Yes') FROM customer_data GROUP BY creditrating",
+     ["Churn rate for each credit rating",
+      "Show churn rate grouped by credit rating",
+      "How does the churn rate vary across credit ratings?"]),
+    ("Which customers have the highest churn probability?",
+     "SELECT customer_id, churn_probability FROM customer_data ORDER BY churn_probability DESC LIMIT 10",
+     ["Top customers by churn probability",
+      "Customers most likely to churn",
+      "List the customers with the highest probability of churning"]),
+    ("What is the average number of dropped calls for churned customers?",
+     "SELECT AVG(droppedcalls) FROM customer_data WHERE churn = 'Yes'",
+     ["Average dropped calls among churned customers",
+      "How many calls do churned customers drop on average?",
+      "mean dropped calls for customers who churned"]),
+    ("How many customers live in each service area?",
+     "SELECT servicearea, COUNT(*) FROM customer_data GROUP BY servicearea",
+     ["Customer count per service area",
+      "Number of customers by service area",
+      "How are customers distributed across service areas?"]),
+    ("What is the average customer lifetime value by income group?",
+     "SELECT incomegroup, AVG(clv) FROM customer_data GROUP BY incomegroup",
+     ["Average CLV per income group",
+      "How does customer lifetime value differ by income group?",
+      "mean lifetime value of customers for each income group"]),
+    ("Show all data for customer 3000026",
+     "SELECT * FROM customer_data WHERE customer_id = 3000026",
+     ["Get all the data for customer 3000026",
+      "Display every column for customer id 3000026",
+      "customer 3000026 details"]),
+    ("What is the churn rate for customers with more than 2 customer care calls?",
+     "SELECT AVG(churn = 'Yes') FROM customer_data WHERE customercarecalls > 2",
+     ["Churn rate of customers who made over 2 customer care calls",
+      "How often do customers with more than two care calls churn?",
+      "churn rate when customer care calls exceed 2"]),
+    ("What is the average overage minutes for customers in the Premium plan?",
+     "SELECT AVG(overageminutes) FROM customer_data WHERE plan = 'Premium'",
+     ["Average overage minutes of Premium plan customers",
+      "How many overage minutes do Premium customers use on average?",
+      "mean overage minutes on the Premium plan"]),
+    ("How many customers own more than one handset?",
+     "SELECT COUNT(*) FROM customer_data WHERE handsets > 1",
+     ["Number of customers with multiple handsets",
+      "Count customers who have more than 1 handset",
+      "how many customers have several handsets"]),
+    ("What is the churn rate by age group?",
+     "SELECT agegroup, AVG(churn = 'Yes') FROM customer_data GROUP BY agegroup",
+     ["Churn rate for each age group",
+      "How does churn vary with customer age group?",
+      "show the churn rate per age group"]),
+]
+
+# Questions with no counterpart in the corpus; any hit under a threshold is a false match
+OUT_OF_DOMAIN = [
+    "What is the weather in Paris tomorrow?",
+    "Explain the SHAP values of the model",
+    "Give me recommendations to reduce churn for customer 3000026",
+    "What is the model accuracy on the test set?",
+    "Plot monthly revenue against churn probability",
+    "Who founded the company?",
+]
+
+VOCABULARY = (
+    "customers customer churn churned revenue monthly average total count number rate plan premium basic "
+    "calls dropped blocked care roaming overage minutes handsets handset models income group age credit "
+    "rating service area lifetime value clv subscribers active retention referrals equipment days "
+    "probability highest lowest top show list by per for with more than less each which how many what is"
+).split()
+
+
+class HashedNgramEmbedder:
+    """Deterministic embedding: word unigrams, word bigrams and character trigrams hashed into `dim` buckets."""
+
+    def __init__(self, dim=128):
+        self.dim = dim
+
+    def features(self, text):
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        feats = [(w, 1.0) for w in words]
+        feats += [(a + " " + b, 0.7) for a, b in zip(words, words[1:])]
+        for w in words:
+            padded = f" {w} "
+            feats += [(padded[i:i + 3], 0.4) for i in range(len(padded) - 2)]
+        return feats
+
+    def embed(self, texts, kind='document'):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # The top bit picks the sign so collisions cancel out instead of piling up
+                matrix[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class GoogleEmbedder:
+    """
+    The production embedding model (llm_configs.yml embedding_model) behind the
+    shared embedding cache. Stored questions are embedded as documents and lookups
+    as queries, as in the app; cached vectors are reused across runs.
+    """
+
+    def __init__(self, model=None, config_path='llm_configs.yml'):
+        # Imported here so the hashed runs need neither the Google client nor an API key
+        from dotenv import load_dotenv
+        from query_engine.embedding_cache import get_cached_embeddings
+        load_dotenv()
+        if model is None:
+            with open(config_path, 'r') as f:
+                model = yaml.safe_load(f)['embedding_model']
+        self.embeddings = get_cached_embeddings(model, os.getenv('GOOGLE_API_KEY'), caller='retrieval_benchmark')
+
+    def embed(self, texts, kind='document'):
+        vectors = self.embeddings.cache.embed(list(texts), kind, self.embeddings.caller)
+        matrix = np.asarray(vectors, dtype=np.float32)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+class NumpyVectorStore:
+    """Stand-in for the TiDB vector table: exact cosine search over normalized rows."""
+
+    def __init__(self, vectors, payloads):
+        self.vectors = vectors
+        self.payloads = payloads
+
+    def search(self, query, k):
+        similarities = self.vectors @ query
+        k = min(k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(int(i), 1.0 - float(similarities[i])) for i in top]
+
+
+def load_corpus(csv_path=None):
+    """Returns [(question, sql, paraphrases)]; CSV rows get paraphrases from simple rewrites."""
+    if not csv_path:
+        return FIXTURE
+    rewrites = [("what is the", "show the"), ("how many", "count of"), ("average", "mean"),
+                ("customers", "clients"), ("?", "")]
+    corpus = []
+    with open(csv_path, "r", newline="") as f:
+        for record in csv.DictReader(f):
+            question = record["question"]
+            lowered = question.lower()
+            paraphrases = []
+            for old, new in rewrites:
+                if old in lowered:
+                    lowered = lowered.replace(old, new)
+                    paraphrases.append(lowered)
+            corpus.append((question, record["sql"], paraphrases[-2:] or [lowered]))
+    return corpus
+
+
+def distractors(embedder, count, rng, pool_size=20000):
+    """
+    Plausible but unrelated questions built from the domain vocabulary. Beyond
+    `pool_size` they are jittered copies of the pool, which keeps 1M-entry runs fast
+    to build while still crowding the neighbourhood of real questions.
+    """
+    pool_texts = [" ".join(rng.choice(VOCABULARY, size=rng.integers(5, 12))) for _ in range(min(count, pool_size))]
+    pool = embedder.embed(pool_texts)
+    if count <= len(pool):
+        return pool[:count]
+    copies = pool[rng.integers(0, len(pool), size=count - len(pool))]
+    copies = copies + rng.normal(scale=0.05, size=copies.shape).astype(np.float32)
+    copies /= np.linalg.norm(copies, axis=1, keepdims=True)
+    return np.vstack([pool, copies])
+
+
+def evaluate(store, embedder, corpus, ks, thresholds):
+    queries, targets = [], []
+    for index, (_, _, paraphrases) in enumerate(corpus):
+        for paraphrase in paraphrases:
+            queries.append(paraphrase)
+            targets.append(index)
+    queries += OUT_OF_DOMAIN
+    targets += [None] * len(OUT_OF_DOMAIN)
+    query_vectors = embedder.embed(queries, kind='query')
+
+    max_k = max(ks)
+    hits = {k: 0 for k in ks}
+    top1 = []
+    latencies = []
+    for vector, target in zip(query_vectors, targets):
+        start = time.perf_counter()
+        results = store.search(vector, max_k)
+        latencies.append(time.perf_counter() - start)
+        ids = [i for i, _ in results]
+        if target is not None:
+            for k in ks:
+                hits[k] += target in ids[:k]
+        top1.append((results[0][1], ids[0] == target))
+
+    in_domain = sum(t is not None for t in targets)
+    report = {"recall": {k: hits[k] / in_domain for k in ks}, "thresholds": {}}
+    for threshold in thresholds:
+        accepted = [correct for distance, correct in top1 if distance < threshold]
+        report["thresholds"][threshold] = {
+            "precision": sum(accepted) / len(accepted) if accepted else float("nan"),
+            "coverage": len(accepted) / len(top1),
+        }
+    latencies_ms = np.array(latencies) * 1000
+    report["p50_ms"] = float(np.percentile(latencies_ms, 50))
+    report["p99_ms"] = float(np.percentile(latencies_ms, 99))
+    return report
+
+
+def run(sizes, ks=(1, 3, 5), thresholds=(0.1, 0.16, 0.2, 0.25, 0.3), dim=128, csv_path=None, seed=7,
+        embedder='hashed'):
+    """
+    Returns {label: report}, one report per index size. With embedder='google' a
+    first report measures the production model on the corpus alone and the size
+    reports, built with hashed vectors, are marked latency_only.
+    """
+    hashed = HashedNgramEmbedder(dim)
+    corpus = load_corpus(csv_path)
+    reports = {}
+    if embedder == 'google':
+        google = GoogleEmbedder()
+        real = google.embed([question for question, _, _ in corpus])
+        store = NumpyVectorStore(real, [sql for _, sql, _ in corpus])
+        reports[f"{len(real):,} entries, google embeddings"] = evaluate(store, google, corpus, ks, thresholds)
+    real = hashed.embed([question for question, _, _ in corpus])
+    rng = np.random.default_rng(seed)
+    for size in sizes:
+        filler = distractors(hashed, max(0, size - len(real)), rng)
+        vectors = np.vstack([real, filler]) if len(filler) else real
+        store = NumpyVectorStore(vectors, [sql for _, sql, _ in corpus])
+        report = evaluate(store, hashed, corpus, ks, thresholds)
+        report["latency_only"] = embedder == 'google'
+        reports[f"{size:,} entries"] = report
+    return reports
+
+
+def print_report(reports):
+    for label, report in reports.items():
+        latency = f"p50={report['p50_ms']:.3f}ms  p99={report['p99_ms']:.3f}ms"
+        if report.get("latency_only"):
+            print(f"\n== {label} (hashed vectors, latency only) ==  {latency}")
+            continue
+        recall = "  ".join(f"recall@{k}={value:.3f}" for k, value in report["recall"].items())
+        print(f"\n== {label} ==  {recall}  {latency}")
+        print("  distance <   precision   coverage")
+        for threshold, values in report["thresholds"].items():
+            print(f"  {threshold:<10}  {values['precision']:<10.3f}  {values['coverage']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.1, 0.16, 0.2, 0.25, 0.3])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--csv", help="question,sql CSV to use instead of the built-in fixture")
+    parser.add_argument("--embedder", choices=["hashed", "google"], default="hashed",
+                        help="google measures retrieval quality with the production model (cached on disk)")
+    args = parser.parse_args()
+    print_report(run(args.sizes, thresholds=tuple(args.thresholds), dim=args.dim, csv_path=args.csv,
+                     embedder=args.embedder))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import json
+import math
+import time
+import hashlib
+import threading
+from sqlalchemy import text
+
+
+class SchemaCatalog:
+    """
+    Cached view of INFORMATION_SCHEMA for one database.
+
+    Lookups are memoized for a short time so several tools asking about the same
+    tables within a chat turn cost at most one metadata query.
+    """
+
+    def __init__(self, engine, database, version_ttl=5.0, columns_ttl=600.0):
+        self.engine = engine
+        self.database = database
+        self.version_ttl = version_ttl
+        self.columns_ttl = columns_ttl
+        self._versions = {}
+        self._columns = None
+        self._columns_loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def columns(self, max_age=None):
+        """
+        Returns {table: set(columns)} for every table and view in the database, with
+        lower-cased names. The snapshot is reloaded once it is older than `max_age`
+        seconds (`columns_ttl` by default).
+        """
+        max_age = self.columns_ttl if max_age is None else max_age
+        with self._lock:
+            if self._columns is not None and time.monotonic() - self._columns_loaded_at <= max_age:
+                return self._columns
+        query = text("""
+            SELECT LOWER(TABLE_NAME), LOWER(COLUMN_NAME)
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = :database
+        """)
+        snapshot = {}
+        with self.engine.connect() as connection:
+            for table, column in connection.execute(query, {"database": self.database}):
+                snapshot.setdefault(table, set()).add(column)
+        with self._lock:
+            self._columns = snapshot
+            self._columns_loaded_at = time.monotonic()
+        return snapshot
+
+    def table_versions(self, tables):
+        """
+        Returns {table: version} for the given tables, where version changes whenever
+        the table is recreated, truncated or its row statistics move.
+
+        Tables that do not exist map to None.
+
+        TiDB refreshes UPDATE_TIME and TABLE_ROWS lazily (from its statistics, not on
+        each write), so a version can stay unchanged for a while after rows are written.
+        It catches DDL and large loads; callers that cache data behind it must also
+        expire entries after a short time (see QueryResultCache.ttl_seconds).
+        """
+        tables = sorted({t.lower() for t in tables})
+        now = time.monotonic()
+        with self._lock:
+            stale = [t for t in tables if t not in self._versions or now - self._versions[t][0] > self.version_ttl]
+        if stale:
+            fresh = {t: None for t in stale}
+            params = {f"t{i}": t for i, t in enumerate(stale)}
+            placeholders = ", ".join(f":t{i}" for i in range(len(stale)))
+            query = text(f"""
+                SELECT LOWER(TABLE_NAME), TIDB_TABLE_ID, CREATE_TIME, UPDATE_TIME, TABLE_ROWS
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = :database AND LOWER(TABLE_NAME) IN ({placeholders})
+            """)
+            with self.engine.connect() as connection:
+                for name, table_id, created, updated, rows in connection.execute(query, {"database": self.database, **params}):
+                    fresh[name] = (table_id, str(created), str(updated), rows)
+            with self._lock:
+                for table, version in fresh.items():
+                    self._versions[table] = (now, version)
+        with self._lock:
+            return {t: self._versions[t][1] for t in tables}
+
+    def fingerprint(self):
+        """
+        Returns a hash of the database shape: tables, their columns and the order of
+        magnitude of their row counts. It changes when tables or columns are added,
+        dropped or renamed, or when a table grows or shrinks by roughly 10x.
+        """
+        columns = self.columns(max_age=0)
+        query = text("""
+            SELECT LOWER(TABLE_NAME), TABLE_ROWS
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = :database
+        """)
+        with self.engine.connect() as connection:
+            row_counts = dict(connection.execute(query, {"database": self.database}).fetchall())
+        shape = {
+            table: [sorted(table_columns), int(math.log10((row_counts.get(table) or 0) + 1))]
+            for table, table_columns in columns.items()
+        }
+        return hashlib.sha256(json.dumps(shape, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def invalidate(self):
+        with self._lock:
+            self._versions.clear()
+            self._columns = None
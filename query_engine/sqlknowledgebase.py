@@ -1,36 +1,136 @@
 import os
-import csv
+import json
+import argparse
+import time
+import threading
+import yaml
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import TiDBVectorStore
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from tidb_vector.integrations import TiDBVectorClient
+from query_engine.bulk_loader import BulkEmbeddingLoader
+from query_engine.embedding_cache import get_cached_embeddings
+from query_engine.engine_registry import get_engine, shared_engine_args
+from query_engine.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from query_engine.local_ann import LocalANNIndex, normalize_question
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
+# Load environment variables and configuration
 load_dotenv()
+with open('llm_configs.yml', 'r') as f:
+    llm_config = yaml.safe_load(f)
 tidb_connection_string = os.getenv('TIDB_CONNECTION_URL')
 google_api_key = os.getenv('GOOGLE_API_KEY')
 
-# Initialize Google embedding model
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=google_api_key)
+# Google embedding model behind the process-wide embedding cache shared with the feedback store
+embeddings = get_cached_embeddings("models/text-embedding-004", google_api_key, caller='sqlknowledgebase')
 
 TABLE_NAME = "known_good_sqlbase_vector"
 
+
+def question_hash_sql(value):
+    """
+    SQL for the hash of a normalized question, the same normalization as
+    local_ann.normalize_question: tabs and line breaks become spaces, surrounding
+    spaces are trimmed and the text is lower-cased.
+    """
+    for code in (9, 10, 13):
+        value = f"REPLACE({value}, CHAR({code} USING utf8mb4), ' ')"
+    return f"SHA2(LOWER(TRIM({value})), 256)"
+
+
+def migrate_question_index(engine):
+    """
+    Adds (or rebuilds, when it was created with an older normalization) the indexed
+    virtual column holding the hash of the normalized question text, so exact
+    matches can be found without embedding the query or scanning vectors. Run from
+    the loading path, not when the app starts. Safe to call repeatedly.
+    """
+    with engine.begin() as connection:
+        expression = connection.execute(text("""
+            SELECT GENERATION_EXPRESSION FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = 'question_hash'
+        """), {"table": TABLE_NAME}).scalar()
+        if expression is not None and 'replace' not in expression.lower():
+            connection.execute(text(f"ALTER TABLE {TABLE_NAME} DROP COLUMN question_hash"))
+            logger.info(f"Dropped outdated question_hash column from {TABLE_NAME}.")
+            expression = None
+        if expression is None:
+            connection.execute(text(
+                f"ALTER TABLE {TABLE_NAME} ADD COLUMN question_hash CHAR(64) "
+                f"AS ({question_hash_sql('document')}) VIRTUAL"))
+            logger.info(f"Added question_hash column to {TABLE_NAME}.")
+        indexed = connection.execute(text("""
+            SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND INDEX_NAME = 'idx_question_hash'
+        """), {"table": TABLE_NAME}).scalar()
+        if not indexed:
+            connection.execute(text(f"ALTER TABLE {TABLE_NAME} ADD INDEX idx_question_hash (question_hash)"))
+            logger.info(f"Added idx_question_hash index to {TABLE_NAME}.")
+
+
+def insert_embedded_rows(engine, table_name, rows):
+    """
+    Writes (id, embedding, document, metadata) rows into a TiDBVectorStore table with
+    one multi-row INSERT. Existing ids are overwritten, so rewriting a batch is safe.
+    """
+    if not rows:
+        return 0
+    params = [
+        {"id": row_id, "embedding": json.dumps(list(embedding)), "document": document, "meta": json.dumps(metadata)}
+        for row_id, embedding, document, metadata in rows
+    ]
+    # Executed as a single INSERT ... VALUES (...), (...) by the PyMySQL driver
+    with engine.begin() as connection:
+        connection.execute(text(f"""
+            INSERT INTO {table_name} (id, embedding, document, meta)
+            VALUES (:id, :embedding, :document, :meta)
+            ON DUPLICATE KEY UPDATE embedding = VALUES(embedding), document = VALUES(document), meta = VALUES(meta)
+        """), params)
+    return len(rows)
+
+
 class VectorDBCreator:
     def __init__(self):
-        self.engine = create_engine(tidb_connection_string)
+        self.engine = get_engine(tidb_connection_string)
+        self._store_lock = threading.Lock()
         self.vector_store = self.load_existing_vector_store()
+        self.question_index_ready = self.has_question_index() if self.vector_store else False
+        self.local_index = self.create_local_index()
+        self.hybrid_settings = llm_config.get('hybrid_retrieval', {})
+        self.lexical_index = None
+        self.lexical_index_built_at = 0.0
+        self._lexical_refresh = None
+
+    def create_local_index(self):
+        """
+        Returns the in-process ANN mirror of the table when enabled in llm_configs.yml,
+        or None. The mirror is loaded from disk if present and synced in the background.
+        """
+        settings = llm_config.get('local_ann', {})
+        if not settings.get('enabled'):
+            return None
+        try:
+            index = LocalANNIndex(self.engine, TABLE_NAME, settings.get('index_dir', 'query_engine/ann_index'),
+                                  backend=settings.get('backend', 'numpy'),
+                                  sync_interval=settings.get('sync_interval', 300))
+            index.maybe_sync()
+            return index
+        except Exception as e:
+            logger.warning(f"Local ANN index disabled: {e}")
+            return None
 
     def load_existing_vector_store(self):
         try:
             vector_store = TiDBVectorStore.from_existing_vector_table(
                 embedding=embeddings,
                 connection_string=tidb_connection_string,
-                table_name=TABLE_NAME
+                table_name=TABLE_NAME,
+                engine_args=shared_engine_args(tidb_connection_string)
             )
             logger.info("Existing vector store loaded successfully.")
             return vector_store
@@ -51,24 +151,70 @@ class VectorDBCreator:
                 metadatas=metadatas,
                 connection_string=tidb_connection_string,
                 table_name=TABLE_NAME,
-                distance_strategy="cosine"
+                distance_strategy="cosine",
+                engine_args=shared_engine_args(tidb_connection_string)
             )
             logger.info(f"Created new vector store with {len(texts)} entries.")
+            self.migrate_schema()
+
+    def has_question_index(self):
+        """
+        Returns True when the table has an up to date question_hash column. Only
+        detects it: the column is added by migrate_schema on the loading path.
+        """
+        try:
+            with self.engine.connect() as connection:
+                expression = connection.execute(text("""
+                    SELECT GENERATION_EXPRESSION FROM INFORMATION_SCHEMA.COLUMNS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = 'question_hash'
+                """), {"table": TABLE_NAME}).scalar()
+        except Exception as e:
+            logger.warning(f"Could not check the question hash column: {e}")
+            return False
+        if expression is None or 'replace' not in expression.lower():
+            logger.warning("Question hash column missing or outdated, exact matches will use the vector search. "
+                           "Run python -m query_engine.sqlknowledgebase --migrate to migrate the table.")
+            return False
+        return True
+
+    def migrate_schema(self):
+        """Brings the table's question_hash column up to date, then refreshes question_index_ready."""
+        try:
+            migrate_question_index(self.engine)
+        except Exception as e:
+            logger.warning(f"Question hash migration failed: {e}")
+        self.question_index_ready = self.has_question_index()
 
-    def load_and_embed_data(self, csv_file_path):
+    def find_exact_match(self, query):
+        """Returns the SQL answer stored for exactly this question (case and surrounding whitespace ignored), or None."""
+        with self.engine.connect() as connection:
+            meta = connection.execute(text(
+                f"SELECT meta FROM {TABLE_NAME} WHERE question_hash = {question_hash_sql(':query')} LIMIT 1"
+            ), {"query": query}).scalar()
+        if meta is None:
+            return None
+        if isinstance(meta, (str, bytes)):
+            meta = json.loads(meta)
+        return meta.get("sql_answer")
+
+    def load_and_embed_data(self, csv_file_path, batch_size=100, max_workers=4, requests_per_minute=600,
+                            checkpoint_path=None):
+        """
+        Bulk loads question/SQL pairs from a CSV. The file is streamed in batches that
+        are embedded concurrently under a rate limit and written with multi-row
+        inserts; progress is checkpointed so a rerun resumes where the last one failed.
+        """
         try:
-            texts = []
-            metadatas = []
-
-            with open(csv_file_path, 'r') as file:
-                csv_reader = csv.DictReader(file)
-                for row in csv_reader:
-                    texts.append(row['question'])
-                    metadatas.append({"sql_answer": row['sql']})
-
-            self.create_or_update_vector_store(texts, metadatas)
-            logger.info(f"Data loaded and embedded successfully. {len(texts)} rows processed.")
-            self.verify_data_insertion(len(texts))
+            loader = BulkEmbeddingLoader(
+                # Bulk loads bypass the shared cache so they do not evict the vectors of live questions
+                embeddings.cache.embedder,
+                self.write_embedded_rows,
+                batch_size=batch_size, max_workers=max_workers, requests_per_minute=requests_per_minute,
+            )
+            to_row = lambda record: (record['question'], {"sql_answer": record['sql']})
+            total_rows = loader.load(csv_file_path, to_row, checkpoint_path)
+            logger.info(f"Data loaded and embedded successfully. {total_rows} rows processed.")
+            self.verify_data_insertion(total_rows)
         except FileNotFoundError:
             logger.error(f"CSV file not found: {csv_file_path}")
             raise
@@ -76,6 +222,26 @@ class VectorDBCreator:
             logger.error(f"Error loading and embedding data: {e}")
             raise
 
+    def write_embedded_rows(self, rows):
+        with self._store_lock:
+            if not self.vector_store:
+                # Create the empty table with the dimension of the vectors already in hand,
+                # so the first batch is written like every other one instead of re-embedded
+                client = TiDBVectorClient(
+                    connection_string=tidb_connection_string,
+                    table_name=TABLE_NAME,
+                    distance_strategy="cosine",
+                    vector_dimension=len(rows[0][1]),
+                    engine_args=shared_engine_args(tidb_connection_string)
+                )
+                # TiDBVectorClient has no close(); its engine only borrows registry connections
+                client._bind.dispose()
+                insert_embedded_rows(self.engine, TABLE_NAME, rows)
+                self.vector_store = self.load_existing_vector_store()
+                self.migrate_schema()
+                return len(rows)
+        return insert_embedded_rows(self.engine, TABLE_NAME, rows)
+
     def verify_data_insertion(self, expected_count):
         try:
             with self.engine.connect() as connection:
@@ -96,45 +262,138 @@ class VectorDBCreator:
             logger.error(f"Error verifying data insertion: {e}")
 
     def find_similar_questions(self, query, top_k=3):
+        """
+        Returns (sql_answer, True) for an exact match, else ([(question, sql_answer,
+        distance)], False). distance is the cosine distance, or None for a decisive
+        lexical match (the same question with other literals), which has no vector
+        distance and is accepted on its lexical similarity instead.
+        """
         if not self.vector_store:
             logger.error("Vector store not initialized. Unable to find similar questions.")
             return [], False
 
         try:
-            # First, try to find an exact match
-            exact_matches = self.vector_store.similarity_search_with_score(
-                query, k=1, filter={"question": query}
-            )
-            
-            if exact_matches:
-                exact_match = exact_matches[0]
+            use_local = self.local_index is not None and self.local_index.ready
+            if use_local:
+                self.local_index.maybe_sync()
+
+            # Exact matches need no embedding and no vector scan
+            sql_answer = self.find_exact_match_any(query, use_local)
+            if sql_answer is not None:
                 logger.info(f"Exact match found for query: {query}")
-                return exact_match[0].metadata["sql_answer"], True
+                return sql_answer, True
+
+            lexical_results = []
+            if self.hybrid_settings.get('enabled'):
+                self.maybe_refresh_lexical_index()
+                lexical_results = self.lexical_search(query, top_k)
+                decisive_similarity = self.hybrid_settings.get('decisive_similarity', 0.9)
+                decisive = [(question, sql_answer, None) for question, sql_answer, similarity in lexical_results
+                            if similarity >= decisive_similarity]
+                if decisive:
+                    # Same question with different literals: skip the embedding and vector search
+                    logger.info(f"Decisive lexical match found for query: {query}")
+                    return decisive, False
 
-            # If no exact match, find similar questions
-            similar_questions = self.vector_store.similarity_search_with_score(query, k=top_k)
-            
-            results = [
-                (doc.page_content, doc.metadata["sql_answer"], score)
-                for doc, score in similar_questions
-            ]
+            # Otherwise a single vector search returns everything the caller needs
+            if use_local:
+                vector_results = [
+                    (document, metadata["sql_answer"], distance)
+                    for document, metadata, distance in self.local_index.search(embeddings.embed_query(query), top_k)
+                ]
+            else:
+                vector_results = [
+                    (doc.page_content, doc.metadata["sql_answer"], score)
+                    for doc, score in self.vector_store.similarity_search_with_score(query, k=top_k)
+                ]
 
+            normalized_query = normalize_question(query)
+            for question, sql_answer, _ in vector_results:
+                if normalize_question(question) == normalized_query:
+                    logger.info(f"Exact match found for query: {query}")
+                    return sql_answer, True
+
+            results = self.fuse_results(lexical_results, vector_results, top_k) if lexical_results else vector_results
             logger.info(f"Found {len(results)} similar questions for query: {query}")
             return results, False
         except Exception as e:
             logger.error(f"Error finding similar questions: {e}")
             raise
 
-# Global instance for retrieval mode
-vector_db = VectorDBCreator()
+    def find_exact_match_any(self, query, use_local):
+        if use_local:
+            metadata = self.local_index.exact_match(query)
+            return None if metadata is None else metadata["sql_answer"]
+        if self.question_index_ready:
+            return self.find_exact_match(query)
+        return None
+
+    def maybe_refresh_lexical_index(self):
+        """Builds the lexical index on first use and rebuilds it in the background once it is older than refresh_interval."""
+        if self.lexical_index is None:
+            self.refresh_lexical_index()
+            return
+        interval = self.hybrid_settings.get('refresh_interval', 300)
+        if time.monotonic() - self.lexical_index_built_at < interval:
+            return
+        if self._lexical_refresh is not None and self._lexical_refresh.is_alive():
+            return
+        self.lexical_index_built_at = time.monotonic()
+        self._lexical_refresh = threading.Thread(target=self.refresh_lexical_index, name="lexical-index-refresh", daemon=True)
+        self._lexical_refresh.start()
+
+    def refresh_lexical_index(self):
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(text(f"SELECT document, meta FROM {TABLE_NAME}")).fetchall()
+            documents = [(document, json.loads(meta) if isinstance(meta, (str, bytes)) else meta)
+                         for document, meta in rows]
+            self.lexical_index = LexicalIndex(documents)
+            self.lexical_index_built_at = time.monotonic()
+            logger.info(f"Lexical index built with {len(documents)} questions.")
+        except Exception as e:
+            logger.warning(f"Failed to build lexical index: {e}")
+
+    def lexical_search(self, query, top_k):
+        """Returns [(question, sql_answer, lexical_similarity)], best first."""
+        if not self.lexical_index:
+            return []
+        return [
+            (self.lexical_index.documents[i], self.lexical_index.metadatas[i]["sql_answer"], similarity)
+            for i, _, similarity in self.lexical_index.search(query, top_k)
+        ]
+
+    def fuse_results(self, lexical_results, vector_results, top_k):
+        """
+        Reciprocal rank fusion of the lexical and vector rankings, used to reorder the
+        vector results. Lexical similarities are not on the cosine distance scale the
+        callers' thresholds use, so questions found only lexically are left out and
+        every result keeps its vector distance.
+        """
+        by_question = {question: (question, sql_answer, distance) for question, sql_answer, distance in vector_results}
+        fused = reciprocal_rank_fusion(
+            [[question for question, _, _ in lexical_results], [question for question, _, _ in vector_results]],
+            k=self.hybrid_settings.get('rrf_k', 60),
+        )
+        return [by_question[question] for question in fused if question in by_question][:top_k]
 
 def main():
+    parser = argparse.ArgumentParser(description="Creates the question/SQL vector table from the known-good CSV.")
+    parser.add_argument("--migrate", action="store_true",
+                        help="only add or rebuild the question_hash column and its index, without reloading the CSV")
+    args = parser.parse_args()
+    if args.migrate:
+        migrate_question_index(get_engine(tidb_connection_string))
+        logger.info("Question hash migration complete.")
+        return
+
     # This function is used for the initial creation of the vector database
     vector_db_creator = VectorDBCreator()
     
     # Load and embed data from CSV
     csv_file_path = 'data/telecom_churn/known_good_sqlbase.csv'
     vector_db_creator.load_and_embed_data(csv_file_path)
+    vector_db_creator.migrate_schema()
 
     # Example usage of find_similar_questions
     query = "What is the average monthly charges for customers who have churned?"
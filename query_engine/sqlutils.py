@@ -0,0 +1,242 @@
+import re
+import hashlib
+
+# Order matters: comments and quoted tokens must win over the generic patterns
+TOKEN_PATTERN = re.compile(r"""
+    (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted_ident>`(?:[^`]|``)*`)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_@$][\w$]*)
+  | (?P<op><=>|<=|>=|<>|!=|:=|\|\||&&|[-+*/%=<>!~^&|])
+  | (?P<punct>[(),.;])
+  | (?P<space>\s+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+CLAUSE_KEYWORDS = {
+    'where', 'group', 'order', 'having', 'limit', 'union', 'on', 'using', 'join', 'inner',
+    'left', 'right', 'cross', 'full', 'natural', 'straight_join', 'window', 'for', 'lock',
+    'into', 'set', 'values', 'select', 'from', 'as', 'with', 'except', 'intersect',
+}
+
+
+def tokenize_sql(sql):
+    """
+    Splits SQL into (kind, value) tokens, dropping whitespace and comments.
+
+    Kinds are 'string', 'quoted_ident', 'number', 'ident', 'op', 'punct' and 'other'.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind in ('space', 'comment'):
+            continue
+        tokens.append((kind, match.group()))
+    return tokens
+
+
+def identifier_name(kind, value):
+    """Returns the lower-cased name of an identifier token, or None for other tokens."""
+    if kind == 'ident':
+        return value.lower()
+    if kind == 'quoted_ident':
+        return value[1:-1].replace('``', '`').lower()
+    return None
+
+
+# Functions whose result changes between executions of the same statement
+NON_DETERMINISTIC_FUNCTIONS = {
+    'now', 'sysdate', 'curdate', 'curtime', 'current_date', 'current_time', 'current_timestamp',
+    'localtime', 'localtimestamp', 'utc_date', 'utc_time', 'utc_timestamp', 'unix_timestamp',
+    'rand', 'random_bytes', 'uuid', 'uuid_short', 'connection_id', 'last_insert_id', 'found_rows',
+    'row_count', 'tidb_current_tso', 'sleep',
+}
+
+
+def canonical_sql(sql):
+    """
+    Returns a canonical form of the SQL: comments and redundant whitespace removed,
+    keywords and identifiers lower-cased, identifier quoting dropped and the trailing
+    semicolon stripped. String literals are kept verbatim.
+    """
+    parts = []
+    for kind, value in tokenize_sql(sql):
+        name = identifier_name(kind, value)
+        parts.append(name if name is not None else value)
+    while parts and parts[-1] == ';':
+        parts.pop()
+    return ' '.join(parts)
+
+
+def fingerprint_sql(sql):
+    """Returns a stable hash of `canonical_sql(sql)`."""
+    return hashlib.sha256(canonical_sql(sql).encode('utf-8')).hexdigest()
+
+
+def is_read_query(sql):
+    """True if the statement starts with SELECT, WITH, TABLE or a parenthesised SELECT."""
+    for kind, value in tokenize_sql(sql):
+        if value == '(':
+            continue
+        return identifier_name(kind, value) in ('select', 'with', 'table')
+    return False
+
+
+def _skip_parens(tokens, i):
+    """Given tokens[i] == '(', returns the index just past the matching ')'."""
+    depth = 0
+    while i < len(tokens):
+        if tokens[i][1] == '(':
+            depth += 1
+        elif tokens[i][1] == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def cte_names(tokens):
+    """Returns the names defined by WITH clauses in a token list."""
+    names = set()
+    n = len(tokens)
+    for i, (kind, value) in enumerate(tokens):
+        if identifier_name(kind, value) != 'with':
+            continue
+        j = i + 1
+        if j < n and identifier_name(*tokens[j]) == 'recursive':
+            j += 1
+        # name [(columns)] AS (body) [, name [(columns)] AS (body)]*
+        while j < n:
+            name = identifier_name(*tokens[j])
+            if name is None:
+                break
+            j += 1
+            if j < n and tokens[j][1] == '(':
+                j = _skip_parens(tokens, j)
+            if not (j < n and identifier_name(*tokens[j]) == 'as'):
+                break
+            names.add(name)
+            j += 1
+            if j < n and tokens[j][1] == '(':
+                j = _skip_parens(tokens, j)
+            if j < n and tokens[j][1] == ',':
+                j += 1
+                continue
+            break
+    return names
+
+
+# Functions whose argument syntax uses FROM without referencing a table
+FROM_FUNCTIONS = {'extract', 'trim', 'substring', 'substr', 'position', 'overlay'}
+
+
+def _from_in_function(tokens, index):
+    """True if the FROM at tokens[index] sits directly inside e.g. EXTRACT(... FROM ...)."""
+    depth = 0
+    for k in range(index - 1, -1, -1):
+        value = tokens[k][1]
+        if value == ')':
+            depth += 1
+        elif value == '(':
+            if depth == 0:
+                return k > 0 and identifier_name(*tokens[k - 1]) in FROM_FUNCTIONS
+            depth -= 1
+    return False
+
+
+def _alias_at(tokens, i):
+    """Parses an optional [AS] alias at tokens[i]; returns (alias, next_index)."""
+    n = len(tokens)
+    if i < n and identifier_name(*tokens[i]) == 'as':
+        i += 1
+    if i < n:
+        candidate = identifier_name(*tokens[i])
+        if candidate is not None and not (tokens[i][0] == 'ident' and candidate in CLAUSE_KEYWORDS):
+            return candidate, i + 1
+    return None, i
+
+
+def table_references(tokens):
+    """
+    Returns (schema, table, alias) tuples for every table referenced after FROM,
+    JOIN, UPDATE or INTO, including those inside subqueries. Derived tables are
+    reported with table None and their alias.
+    """
+    references = []
+    i = 0
+    n = len(tokens)
+    while i < n:
+        keyword = identifier_name(*tokens[i])
+        i += 1
+        if keyword not in ('from', 'join', 'update', 'into', 'straight_join'):
+            continue
+        if keyword == 'from' and _from_in_function(tokens, i - 1):
+            continue
+        while i < n:
+            if tokens[i][1] == '(':
+                end = _skip_parens(tokens, i)
+                references.extend(table_references(tokens[i + 1:end - 1]))
+                alias, i = _alias_at(tokens, end)
+                references.append((None, None, alias))
+            else:
+                name = identifier_name(*tokens[i])
+                if name is None or (tokens[i][0] == 'ident' and name in CLAUSE_KEYWORDS):
+                    break
+                schema, table = None, name
+                i += 1
+                if i + 1 < n and tokens[i][1] == '.' and identifier_name(*tokens[i + 1]) is not None:
+                    schema, table = table, identifier_name(*tokens[i + 1])
+                    i += 2
+                alias, i = _alias_at(tokens, i)
+                references.append((schema, table, alias))
+            # Comma-separated table lists only continue in FROM clauses
+            if keyword == 'from' and i < n and tokens[i][1] == ',':
+                i += 1
+                continue
+            break
+    return references
+
+
+def top_level_keywords(sql):
+    """Returns the lower-cased unquoted identifiers outside any parentheses (LIMIT, ORDER, UNION, ...)."""
+    keywords = set()
+    depth = 0
+    for kind, value in tokenize_sql(sql):
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+        elif depth == 0 and kind == 'ident':
+            keywords.add(value.lower())
+    return keywords
+
+
+def strip_statement_end(sql):
+    """Returns the SQL up to its last token, without trailing whitespace, comments and semicolons."""
+    end = 0
+    for match in TOKEN_PATTERN.finditer(sql):
+        if match.lastgroup not in ('space', 'comment') and match.group() != ';':
+            end = match.end()
+    return sql[:end]
+
+
+def is_deterministic(sql):
+    """
+    False if the SQL calls a time, random or session-dependent function (NOW(),
+    RAND(), CURRENT_DATE, ...) or reads a user variable, so its result can change
+    without any table changing.
+    """
+    for kind, value in tokenize_sql(sql):
+        if kind == 'ident' and (value.startswith('@') or value.lower() in NON_DETERMINISTIC_FUNCTIONS):
+            return False
+    return True
+
+
+def referenced_tables(sql):
+    """Returns the set of base table names referenced by the SQL (CTE names excluded)."""
+    tokens = tokenize_sql(sql)
+    ctes = cte_names(tokens)
+    return {table for schema, table, alias in table_references(tokens)
+            if table is not None and table not in ctes and table != 'dual'}
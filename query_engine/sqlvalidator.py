@@ -0,0 +1,150 @@
+from query_engine.sqlutils import tokenize_sql, identifier_name, cte_names, table_references, is_read_query
+
+# Words that can appear where a column reference could, and must not be reported as unknown columns
+SQL_KEYWORDS = {
+    'select', 'from', 'where', 'and', 'or', 'not', 'null', 'is', 'in', 'exists', 'between', 'like',
+    'regexp', 'rlike', 'as', 'on', 'join', 'inner', 'left', 'right', 'outer', 'cross', 'natural',
+    'using', 'group', 'by', 'order', 'having', 'limit', 'offset', 'asc', 'desc', 'distinct',
+    'distinctrow', 'all', 'any', 'some', 'union', 'except', 'intersect', 'case', 'when', 'then',
+    'else', 'end', 'true', 'false', 'unknown', 'interval', 'div', 'mod', 'xor', 'with', 'recursive',
+    'over', 'partition', 'rows', 'range', 'unbounded', 'preceding', 'following', 'current', 'row',
+    'window', 'collate', 'binary', 'escape', 'default', 'separator', 'sounds', 'straight_join',
+    'sql_calc_found_rows', 'high_priority', 'sql_no_cache', 'sql_cache', 'lock', 'share', 'mode',
+    'for', 'nowait', 'skip', 'locked', 'dual', 'leading', 'trailing', 'both', 'rollup', 'values',
+    'date', 'time', 'timestamp', 'datetime', 'year', 'month', 'day', 'hour', 'minute', 'second',
+    'microsecond', 'week', 'quarter', 'day_hour', 'day_minute', 'day_second', 'day_microsecond',
+    'hour_minute', 'hour_second', 'hour_microsecond', 'minute_second', 'minute_microsecond',
+    'second_microsecond', 'year_month', 'signed', 'unsigned', 'integer', 'int', 'char', 'varchar',
+    'decimal', 'double', 'float', 'real', 'json', 'nchar', 'boolean', 'bool', 'current_date',
+    'current_time', 'current_timestamp', 'current_user', 'localtime', 'localtimestamp', 'utc_date',
+    'utc_time', 'utc_timestamp', 'table', 'key', 'index', 'force', 'use', 'ignore', 'first', 'last',
+    'nulls', 'zerofill', 'precision', 'character', 'charset', 'utf8mb4', 'format', 'brief',
+}
+
+# Tokens after which an identifier is read as an expression operand (a column reference)
+EXPRESSION_PREFIXES = {
+    'select', 'where', 'and', 'or', 'not', 'on', 'by', 'when', 'then', 'else', 'between',
+    'having', 'distinct', 'in', 'is', 'like', 'case', 'xor', 'div', 'mod', 'all', 'any',
+    ',', '(', '=', '<', '>', '<=', '>=', '<>', '!=', '<=>', '+', '-', '*', '/', '%', '||', '&&',
+}
+
+
+class LocalSQLValidator:
+    """
+    Validates generated SQL against a cached INFORMATION_SCHEMA snapshot without a
+    round trip to the cluster.
+
+    The checks are deliberately conservative: a query is only rejected when it is
+    certainly broken (unbalanced, not a read query, unknown table or unknown
+    column). Anything the lightweight parser cannot judge passes, and EXPLAIN
+    remains the authority whenever a plan is actually needed.
+    """
+
+    def __init__(self, catalog, refresh_after=30.0):
+        self.catalog = catalog
+        # An unknown table may just be newer than the snapshot; reload if it is older than this
+        self.refresh_after = refresh_after
+
+    def validate(self, sql):
+        """
+        Returns (verdict, reason). verdict is True if the query passed, False if it is
+        certainly invalid and None if the schema snapshot could not be loaded.
+        """
+        tokens = tokenize_sql(sql)
+        if not tokens:
+            return False, "Empty SQL"
+        if any(kind == 'other' and value in ("'", '"', '`') for kind, value in tokens):
+            return False, "Unterminated quoted string or identifier"
+        depth = 0
+        for _, value in tokens:
+            depth += {'(': 1, ')': -1}.get(value, 0)
+            if depth < 0:
+                break
+        if depth != 0:
+            return False, "Unbalanced parentheses"
+        if not is_read_query(sql):
+            return False, "Only SELECT queries are allowed"
+
+        try:
+            schema = self.catalog.columns()
+            verdict, reason = self._check_schema(tokens, schema)
+            if verdict is False and reason.startswith("Unknown table"):
+                verdict, reason = self._check_schema(tokens, self.catalog.columns(max_age=self.refresh_after))
+        except Exception as e:
+            return None, f"Schema snapshot unavailable: {e}"
+        return verdict, reason
+
+    def _check_schema(self, tokens, schema):
+        database = (self.catalog.database or '').lower()
+        ctes = cte_names(tokens)
+        sources = {}         # alias or table name -> set of columns, None when unknown (CTE / derived)
+        real_tables = set()
+        for schema_name, table, alias in table_references(tokens):
+            if table is None:
+                sources[alias] = None
+                continue
+            if schema_name not in (None, database):
+                # Other schemas (information_schema, ...) are not in the snapshot
+                sources[alias or table] = None
+                continue
+            if table in ctes:
+                sources[alias or table] = None
+                continue
+            if table not in schema:
+                return False, f"Unknown table '{table}'"
+            real_tables.add(table)
+            sources[table] = schema[table]
+            if alias:
+                sources[alias] = schema[table]
+
+        for i in range(len(tokens) - 2):
+            qualifier = identifier_name(*tokens[i])
+            if qualifier is None or tokens[i + 1][1] != '.':
+                continue
+            if i > 0 and tokens[i - 1][1] == '.':
+                continue
+            column = identifier_name(*tokens[i + 2])
+            if column is None or (i + 3 < len(tokens) and tokens[i + 3][1] in ('.', '(')):
+                continue
+            if qualifier in sources and sources[qualifier] is not None and column not in sources[qualifier]:
+                return False, f"Unknown column '{qualifier}.{column}'"
+
+        aliases = self._defined_aliases(tokens) | set(sources) | ctes
+        if any(columns is None for columns in sources.values()):
+            # Columns may come from a CTE or derived table; fall back to every known column
+            known_columns = set().union(*schema.values()) if schema else set()
+        else:
+            known_columns = set().union(*(schema[t] for t in real_tables)) if real_tables else set()
+
+        for i, (kind, value) in enumerate(tokens):
+            name = identifier_name(kind, value)
+            if name is None or name.startswith('@') or (kind == 'ident' and name in SQL_KEYWORDS):
+                continue
+            previous = tokens[i - 1] if i > 0 else None
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            if previous is None or following is not None and following[1] in ('.', '('):
+                continue
+            if previous[1] == '.':
+                continue
+            prefix = identifier_name(*previous) if previous[0] in ('ident', 'quoted_ident') else previous[1]
+            if prefix not in EXPRESSION_PREFIXES:
+                continue
+            if name not in known_columns and name not in aliases:
+                return False, f"Unknown column '{name}'"
+        return True, "OK"
+
+    @staticmethod
+    def _defined_aliases(tokens):
+        """Names introduced with AS, or directly after an expression (implicit aliases)."""
+        aliases = set()
+        for i in range(1, len(tokens)):
+            name = identifier_name(*tokens[i])
+            if name is None:
+                continue
+            previous_kind, previous_value = tokens[i - 1]
+            if identifier_name(previous_kind, previous_value) == 'as' \
+                    or previous_value == ')' or previous_kind in ('string', 'number') \
+                    or (previous_kind in ('ident', 'quoted_ident')
+                        and identifier_name(previous_kind, previous_value) not in SQL_KEYWORDS):
+                aliases.add(name)
+        return aliases
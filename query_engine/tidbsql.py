@@ -1,12 +1,128 @@
 import os
+import re
 import time
 import json
+import math
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import concurrent.futures
 from dotenv import load_dotenv
 import requests
 from requests.auth import HTTPDigestAuth
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from urllib.parse import quote_plus
+from query_engine.engine_registry import get_engine
+from query_engine.chat2data_client import AsyncChat2DataClient, PollBackoff
+from query_engine.columnar import frame_from_rows
+from query_engine.data_summary import DataSummaryManager
+from query_engine.query_cache import QueryResultCache
+from query_engine.question_templates import extract_literals, parameterize_sql, bind_sql
+from query_engine.schema_catalog import SchemaCatalog
+from query_engine.sqlutils import (fingerprint_sql, is_deterministic, is_read_query, referenced_tables, strip_statement_end,
+                                   top_level_keywords)
+from query_engine.sqlvalidator import LocalSQLValidator
+
+
+# Keys of SQL templates in the generated SQL cache, so they never collide with real questions
+TEMPLATE_PREFIX = "template: "
+
+
+class QueryTooExpensiveError(Exception):
+    """Raised by the pre-execution cost guard when a query is estimated to be too heavy to run."""
+
+
+class GeneratedSQLCache:
+    """
+    Persistent cache of generated SQL, stored in SQLite so it is shared by every
+    worker process on the host and survives restarts.
+
+    Entries are keyed on the normalized question plus the data summary job id, so a
+    regenerated data summary invalidates everything generated against the old one.
+    Entries expire after `ttl_seconds`; once `max_entries` is exceeded the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS generated_sql (
+                cache_key TEXT PRIMARY KEY,
+                question TEXT,
+                data_summary_job_id TEXT,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_generated_sql_last_access ON generated_sql (last_access)")
+        self.conn.commit()
+
+    @staticmethod
+    def normalize_question(question):
+        question = re.sub(r'\s+', ' ', question.lower()).strip()
+        return question.rstrip('?.!; ')
+
+    def make_key(self, question, data_summary_job_id):
+        raw = f"{data_summary_job_id}\x1f{self.normalize_question(question)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, question, data_summary_job_id):
+        key = self.make_key(question, data_summary_job_id)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT sql, created_at FROM generated_sql WHERE cache_key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self.conn.execute("DELETE FROM generated_sql WHERE cache_key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE generated_sql SET last_access = ? WHERE cache_key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, question, data_summary_job_id, sql):
+        key = self.make_key(question, data_summary_job_id)
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO generated_sql VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.normalize_question(question), data_summary_job_id, sql, now, now))
+            self.conn.execute("DELETE FROM generated_sql WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.conn.execute("""
+                DELETE FROM generated_sql WHERE cache_key IN (
+                    SELECT cache_key FROM generated_sql ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM generated_sql")
+            self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM generated_sql").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
 
 class TiDBChat2SQL:
     def __init__(self):
@@ -27,7 +143,18 @@ class TiDBChat2SQL:
         self.chat2data_url = f"{self.base_url}/v3/chat2data"
         self.refine_sql_url = f"{self.base_url}/v3/refineSql"
         
-        self.data_summary_job_id = self.load_data_summary_job_id()
+        self.sql_cache = GeneratedSQLCache(os.path.join(script_dir, 'sql_cache.sqlite'))
+
+        # One keep-alive session for every Chat2Data call; reusing the auth object
+        # lets requests answer the digest challenge without an extra 401 round trip
+        self.session = requests.Session()
+        self.session.auth = HTTPDigestAuth(self.public_key, self.private_key)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+        # Background event loop that owns the async client for speculative generation
+        self._loop = None
+        self._async_client = None
+        self._loop_lock = threading.Lock()
 
         # TiDB connection details
         self.tidb_host = os.getenv('TIDB_HOST')
@@ -37,6 +164,15 @@ class TiDBChat2SQL:
         self.tidb_ca_path = os.getenv('TIDB_CA_PATH')
 
         self.engine = self.create_sqlalchemy_engine()
+        self.schema_catalog = SchemaCatalog(self.engine, self.database)
+        self.validator = LocalSQLValidator(self.schema_catalog)
+        # Serves the current data summary job id and regenerates it in the background
+        # when the schema fingerprint changes
+        self.data_summary = DataSummaryManager(self.schema_catalog, self.submit_async, lambda: self._async_client,
+                                               os.path.join(script_dir, 'data_summary_config.json'))
+        self.data_summary.refresh_async()
+        # Shared by every tool that goes through execute_sql
+        self.result_cache = QueryResultCache()
 
     def create_sqlalchemy_engine(self):
         connection_string = (
@@ -49,28 +185,18 @@ class TiDBChat2SQL:
         
         connection_string += "ssl_verify_cert=true&ssl_verify_identity=true"
         
-        return create_engine(connection_string)
-
-    def load_data_summary_job_id(self):
-        config_file = os.path.join(os.path.dirname(__file__), 'data_summary_config.json')
-        if os.path.exists(config_file):
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-                return config.get('data_summary_job_id')
-        return None
+        return get_engine(connection_string)
 
-    def save_data_summary_job_id(self, job_id):
-        config_file = os.path.join(os.path.dirname(__file__), 'data_summary_config.json')
-        with open(config_file, 'w') as f:
-            json.dump({'data_summary_job_id': job_id}, f)
+    @property
+    def data_summary_job_id(self):
+        return self.data_summary.job_id
 
     def api_request(self, url, method='GET', data=None):
-        headers = {'Content-Type': 'application/json'}
         try:
             if method == 'GET':
-                response = requests.get(url, auth=HTTPDigestAuth(self.public_key, self.private_key), headers=headers)
+                response = self.session.get(url)
             elif method == 'POST':
-                response = requests.post(url, auth=HTTPDigestAuth(self.public_key, self.private_key), headers=headers, json=data)
+                response = self.session.post(url, json=data)
             
             response.raise_for_status()
             return response.json()
@@ -80,45 +206,147 @@ class TiDBChat2SQL:
                 print(f"Error response: {e.response.text}")
             return None
 
-    def generate_data_summary(self, force=False):
-        if self.data_summary_job_id and not force:
-            print("Using existing data summary.")
-            return self.data_summary_job_id
+    def async_client(self, **kwargs):
+        """Returns an AsyncChat2DataClient bound to this app's credentials and database."""
+        return AsyncChat2DataClient(self.base_url, self.public_key, self.private_key,
+                                    self.cluster_id, self.database, **kwargs)
 
-        print("Initiating data summary generation...")
-        data = {
-            "cluster_id": self.cluster_id,
-            "database": self.database,
-            "description": f"Data summary for {self.database}",
-            "reuse": False
-        }
-        response = self.api_request(self.summary_url, method='POST', data=data)
-        if response and 'result' in response:
-            self.data_summary_job_id = response['result']['job_id']
-            self.save_data_summary_job_id(self.data_summary_job_id)
-            print(f"Data summary generation job initiated. Job ID: {self.data_summary_job_id}")
-            self.wait_for_job_completion(self.data_summary_job_id)
-            return self.data_summary_job_id
-        print("Failed to initiate data summary generation.")
-        return None
+    def generate_data_summary(self, force=False, wait=False):
+        """
+        Checks the schema fingerprint in the background and regenerates the data summary
+        if it changed (always with force=True). The current job id keeps being served
+        until the new summary is ready; pass wait=True to block until then.
+        """
+        future = self.data_summary.refresh_async(force)
+        if wait:
+            return future.result()
+        return self.data_summary_job_id
 
-    def wait_for_job_completion(self, job_id):
-        while True:
-            status, _ = self.check_job_status(job_id)
-            if status == 'done':
-                print("Job completed successfully.")
-                break
-            elif status == 'failed':
-                print("Job failed.")
-                return
-            else:
-                print("Job is still in progress. Waiting...")
-                time.sleep(10)
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="chat2data-loop", daemon=True).start()
+                self._async_client = self.async_client()
+        return self._loop
+
+    def submit_async(self, coro):
+        """
+        Schedules a coroutine on this instance's background event loop and returns a
+        concurrent.futures.Future without waiting for it.
+
+        The loop (and the AsyncChat2DataClient living on it) is started on first use and
+        kept for the lifetime of the process, so its HTTP connections stay warm.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run_async(self, coro, timeout=300):
+        """
+        Runs a coroutine on the background event loop and waits for the result, at most
+        `timeout` seconds: then the coroutine is cancelled and TimeoutError is raised.
+        """
+        future = self.submit_async(coro)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def ping(self):
+        """Returns True if the TiDB connection pool can serve a trivial query."""
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            print(f"TiDB ping failed: {e}")
+            return False
+
+    def close(self):
+        """Closes the Chat2Data HTTP session and stops the background event loop."""
+        self.session.close()
+        with self._loop_lock:
+            if self._loop is not None:
+                asyncio.run_coroutine_threadsafe(self._async_client.aclose(), self._loop).result(timeout=10)
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+                self._async_client = None
+
+    def chat2sql(self, question, max_retries=5, timeout=60, parallel=1, cache_key=None):
+        """
+        Generates SQL for a question with Chat2Data.
 
-    def chat2sql(self, question, max_retries=5, timeout=60):
+        Results are served from and stored in `sql_cache`, keyed on `cache_key` (the
+        question itself by default) and the current data summary job id. Pass the raw
+        user question as `cache_key` when `question` is an enhanced prompt. The SQL is
+        also stored as a template keyed on the question with its literals masked, so
+        the same question with other ids, numbers, dates or quoted values is answered
+        by binding the new literals (see cached_sql).
+
+        With parallel > 1, attempts are launched in waves of `parallel` concurrent jobs and
+        the first SQL that passes `check_query` wins; `max_retries` still bounds the total
+        number of jobs.
+        """
         if not self.data_summary_job_id:
-            print("No data summary found. Generating one...")
-            self.generate_data_summary()
+            # Chat2Data can answer without a summary; one is generated in the background
+            print("No data summary yet. Generating one in the background...")
+            self.data_summary.refresh_async()
+        else:
+            self.data_summary.maybe_refresh()
+
+        cache_key = cache_key or question
+        cached_sql = self.cached_sql(cache_key)
+        if cached_sql:
+            return cached_sql
+
+        generated_sql = self._generate_sql(question, max_retries, timeout, parallel)
+        if generated_sql:
+            self.sql_cache.put(cache_key, self.data_summary_job_id, generated_sql)
+            template, literals = extract_literals(cache_key)
+            sql_template = parameterize_sql(generated_sql, literals, cache_key)
+            # Only keep a template that gives back this very SQL for this very question
+            if sql_template and bind_sql(sql_template, literals) == generated_sql:
+                self.sql_cache.put(TEMPLATE_PREFIX + template, self.data_summary_job_id, sql_template)
+        return generated_sql
+
+    def cached_sql(self, question):
+        """
+        Returns SQL for the question from `sql_cache` without calling Chat2Data: the SQL
+        cached for this exact question, or a cached template with this question's
+        literals bound into it. Returns None if neither is available.
+        """
+        cached_sql = self.sql_cache.get(question, self.data_summary_job_id)
+        if cached_sql:
+            print("\nCached SQL:", cached_sql)
+            return cached_sql
+
+        template, literals = extract_literals(question)
+        if not literals:
+            return None
+        sql_template = self.sql_cache.get(TEMPLATE_PREFIX + template, self.data_summary_job_id)
+        bound_sql = bind_sql(sql_template, literals) if sql_template else None
+        if bound_sql and self.validator.validate(bound_sql)[0] is not False:
+            print("\nSQL from cached template:", bound_sql)
+            return bound_sql
+        return None
+
+    def _generate_sql(self, question, max_retries, timeout, parallel):
+        if parallel > 1:
+            waves = math.ceil(max_retries / parallel)
+            for wave in range(waves):
+                jobs = min(parallel, max_retries - wave * parallel)
+                print(f"Generating SQL speculatively (Wave {wave + 1}/{waves}, {jobs} jobs)...")
+                try:
+                    # Each job polls for up to `timeout`; the margin covers submission and validation
+                    sql = self.run_async(self._speculative_chat2sql(question, jobs, timeout), timeout=timeout + 30)
+                except concurrent.futures.TimeoutError:
+                    print(f"Wave {wave + 1} timed out.")
+                    continue
+                if sql:
+                    print("\nGenerated SQL:", sql)
+                    return sql
+            print(f"Failed to generate valid SQL after {max_retries} attempts.")
+            return None
 
         for attempt in range(max_retries):
             print(f"Generating SQL (Attempt {attempt + 1}/{max_retries})...")
@@ -146,6 +374,9 @@ class TiDBChat2SQL:
         print(f"Failed to generate valid SQL after {max_retries} attempts.")
         return None
 
+    async def _speculative_chat2sql(self, question, parallel, timeout):
+        return await self._async_client.speculative_chat2sql(question, parallel, timeout, self.check_query)
+
     def initiate_sql_generation(self, question):
         data = {
             "cluster_id": self.cluster_id,
@@ -160,8 +391,8 @@ class TiDBChat2SQL:
         return None
 
     def get_generated_sql(self, job_id, timeout=60):
-        start_time = time.time()
-        while time.time() - start_time < timeout:
+        backoff = PollBackoff(timeout)
+        while not backoff.expired():
             status, result = self.check_job_status(job_id)
             print(f"Job status: {status}")
             if status == 'done':
@@ -169,7 +400,7 @@ class TiDBChat2SQL:
             elif status == 'failed':
                 print(f"SQL generation failed. Result: {result}")
                 return None
-            time.sleep(2)
+            time.sleep(backoff.next_delay())
         print(f"SQL generation timed out after {timeout} seconds.")
         return None
 
@@ -180,22 +411,6 @@ class TiDBChat2SQL:
         print(f"Failed to check job status. Response: {response}")
         return None, None
 
-    def api_request(self, url, method='GET', data=None):
-        headers = {'Content-Type': 'application/json'}
-        try:
-            if method == 'GET':
-                response = requests.get(url, auth=HTTPDigestAuth(self.public_key, self.private_key), headers=headers)
-            elif method == 'POST':
-                response = requests.post(url, auth=HTTPDigestAuth(self.public_key, self.private_key), headers=headers, json=data)
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"API request error: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Error response: {e.response.text}")
-            return None
-
     def refine_sql(self, sql, instruction):
         data = {
             "cluster_id": self.cluster_id,
@@ -208,7 +423,18 @@ class TiDBChat2SQL:
             return response['result'].get('sql')
         return None
 
-    def check_query(self, sql):
+    def check_query(self, sql, require_plan=False):
+        """
+        Validates SQL locally against the cached schema snapshot and only sends
+        EXPLAIN to TiDB when the local check cannot decide or a plan is required.
+        """
+        verdict, reason = self.validator.validate(sql)
+        if verdict is False:
+            print(f"Query check failed locally: {reason}")
+            return False
+        if verdict and not require_plan:
+            return True
+
         try:
             with self.engine.connect() as connection:
                 connection.execute(text("EXPLAIN " + sql))
@@ -217,17 +443,199 @@ class TiDBChat2SQL:
             print(f"Query check failed: {e}")
             return False
 
-    def execute_sql(self, sql):
+    def estimate_query_cost(self, sql):
+        """
+        Returns (estimated_output_rows, estimated_max_rows_processed) from TiDB's EXPLAIN.
+
+        The root operator's estRows is the expected result size; the largest estRows
+        across all operators approximates the heaviest scan or join.
+        """
+        with self.engine.connect() as connection:
+            result = connection.execute(text("EXPLAIN FORMAT='brief' " + sql))
+            est_index = [key.lower() for key in result.keys()].index('estrows')
+            estimates = [float(row[est_index]) for row in result.fetchall()]
+        return estimates[0], max(estimates)
+
+    def guard_query(self, sql, guard):
+        """
+        Classifies a query as cheap or heavy from EXPLAIN estimates before it runs.
+
+        `guard` is a dict with `max_rows` (estimated result rows), optional
+        `max_scan_rows` (estimated rows processed by any operator), `action` and an
+        optional `tool` name used in messages. Heavy queries are either rejected with
+        QueryTooExpensiveError (action 'reject', the default), capped with a LIMIT
+        (action 'limit') or randomly sampled down to `max_rows` (action 'sample').
+        Statements that already have a top-level LIMIT (or, for 'sample', an ORDER BY),
+        or end in a locking or INTO clause, are rejected instead of being rewritten.
+
+        Returns (sql_to_run, note); note is None when the query was left unchanged.
+        """
+        try:
+            output_rows, scanned_rows = self.estimate_query_cost(sql)
+        except Exception as e:
+            print(f"Cost estimate unavailable, running query unguarded: {e}")
+            return sql, None
+
+        max_rows = guard.get('max_rows')
+        max_scan_rows = guard.get('max_scan_rows')
+        tool = guard.get('tool', 'this tool')
+        print(f"Estimated rows: {output_rows:,.0f} returned, {scanned_rows:,.0f} processed")
+
+        if max_scan_rows is not None and scanned_rows > max_scan_rows:
+            raise QueryTooExpensiveError(
+                f"The query is estimated to process about {scanned_rows:,.0f} rows, above the "
+                f"{max_scan_rows:,} row limit for {tool}. Please add filters that narrow the subset "
+                f"or aggregate the data in SQL, then try again.")
+        if max_rows is None or output_rows <= max_rows:
+            return sql, None
+
+        action = guard.get('action', 'reject')
+        # The cap is appended to the statement itself: wrapping it in a derived table
+        # fails on duplicate column names (a.*, b.*) and may drop the inner ORDER BY
+        keywords = top_level_keywords(sql)
+        # Trailing comments and semicolons would swallow or end the statement before the
+        # appended clause, and LIMIT cannot follow FOR UPDATE, LOCK IN SHARE MODE or INTO
+        statement = strip_statement_end(sql)
+        if keywords & {'for', 'lock', 'into'}:
+            action = 'reject'
+        if action == 'limit' and 'limit' not in keywords:
+            note = (f"The result was capped at {max_rows:,} of an estimated {output_rows:,.0f} rows. "
+                    f"Mention to the user that the data shown is partial.")
+            return f"{statement}\nLIMIT {int(max_rows)}", note
+        if action == 'sample' and 'limit' not in keywords and 'order' not in keywords:
+            note = (f"The result is a random sample of about {max_rows:,} of an estimated "
+                    f"{output_rows:,.0f} rows. Mention to the user that figures are based on a sample.")
+            return f"{statement}\nORDER BY RAND() LIMIT {int(max_rows)}", note
+        raise QueryTooExpensiveError(
+            f"The query is estimated to return about {output_rows:,.0f} rows, above the "
+            f"{max_rows:,} row limit for {tool}. Please narrow the question with filters "
+            f"or ask for aggregated results, then try again.")
+
+    def execute_sql(self, sql, use_cache=True, columnar=False, guard=None):
+        """
+        Executes SQL and returns the result as a DataFrame, or None on error.
+
+        With columnar=True the frame is built column by column from the cursor's type
+        metadata (typed NumPy arrays, Categoricals for low-cardinality strings) instead
+        of being inferred from row tuples.
+
+        With a `guard` (see guard_query) the query is checked against EXPLAIN estimates
+        before anything is fetched; QueryTooExpensiveError is raised for rejected
+        queries and any rewrite is described in df.attrs['guard_note'].
+
+        Results of deterministic reads of at least one table are cached by SQL
+        fingerprint and table version; queries without tables or with NOW(), RAND()
+        and similar functions always run.
+        """
         real_engine = self.engine.engine if hasattr(self.engine, 'engine') else self.engine
 
+        cache_key, table_versions = None, None
+        tables = referenced_tables(sql) if use_cache and is_read_query(sql) else set()
+        # Table-less and non-deterministic results are not tied to any table version
+        if tables and is_deterministic(sql):
+            try:
+                table_versions = self.schema_catalog.table_versions(tables)
+                cache_key = fingerprint_sql(sql) + (':columnar' if columnar else '')
+                if guard:
+                    cache_key += ':' + json.dumps(guard, sort_keys=True)
+            except Exception as e:
+                print(f"Result cache bypassed, could not read table versions: {e}")
+        if cache_key:
+            cached_df = self.result_cache.get(cache_key, table_versions)
+            if cached_df is not None:
+                print("SQL result served from cache.")
+                return cached_df
+
+        guard_note = None
+        if guard:
+            sql, guard_note = self.guard_query(sql, guard)
+            if not is_deterministic(sql):
+                # e.g. the RAND() of a sampled rewrite
+                cache_key = None
+
         try:
             start_time = time.time()
             with real_engine.connect() as connection:
                 result = connection.execute(text(sql))
-                df = pd.DataFrame(result.fetchall(), columns=result.keys())
+                if columnar:
+                    description = result.cursor.description
+                    df = frame_from_rows(description, result.fetchall())
+                else:
+                    df = pd.DataFrame(result.fetchall(), columns=result.keys())
+            if guard_note:
+                df.attrs['guard_note'] = guard_note
             end_time = time.time()
             print(f"SQL execution time: {end_time - start_time:.4f} seconds")
+            if cache_key:
+                self.result_cache.put(cache_key, table_versions, df)
             return df
         except Exception as e:
             print(f"Error executing SQL: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def execute_sql_stream(self, sql, chunk_size=10000, max_rows=None, should_abort=None, columnar=False):
+        """
+        Executes SQL with a server-side cursor and yields the result as DataFrame chunks,
+        so memory stays bounded by `chunk_size` rows regardless of the result size.
+
+        Streams never go through the result cache: chunks are neither served from nor
+        stored in it, since caching them would mean holding the whole result in memory.
+
+        Parameters
+        ----------
+        sql : str
+            The SQL query to execute.
+        chunk_size : int
+            Number of rows per yielded DataFrame.
+        max_rows : int, optional
+            Hard cap on the total number of rows yielded.
+        should_abort : callable, optional
+            Called as should_abort(chunk, rows_so_far) after each chunk; returning True
+            stops the stream.
+        columnar : bool
+            Build each chunk column by column from the cursor's type metadata, as
+            execute_sql(columnar=True) does.
+
+        Yields
+        ------
+        pd.DataFrame
+            Consecutive chunks of the result. An empty DataFrame with the result columns
+            is yielded if the query returns no rows.
+        """
+        real_engine = self.engine.engine if hasattr(self.engine, 'engine') else self.engine
+
+        start_time = time.time()
+        rows_seen = 0
+        exhausted = False
+        with real_engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(text(sql))
+            columns = list(result.keys())
+            description = result.cursor.description if columnar else None
+            try:
+                for rows in result.partitions(chunk_size):
+                    if max_rows is not None:
+                        rows = rows[:max_rows - rows_seen]
+                    if columnar:
+                        chunk = frame_from_rows(description, rows)
+                    else:
+                        chunk = pd.DataFrame(rows, columns=columns)
+                    rows_seen += len(chunk)
+                    yield chunk
+                    if max_rows is not None and rows_seen >= max_rows:
+                        print(f"Row cap of {max_rows} reached. Stopping stream.")
+                        break
+                    if should_abort is not None and should_abort(chunk, rows_seen):
+                        print(f"Stream aborted by caller after {rows_seen} rows.")
+                        break
+                else:
+                    exhausted = True
+                    if rows_seen == 0:
+                        yield pd.DataFrame(columns=columns)
+            finally:
+                if exhausted:
+                    result.close()
+                else:
+                    # An unbuffered cursor drains every remaining row on close; drop the
+                    # connection instead so an early stop really stops the transfer
+                    connection.invalidate()
+        print(f"SQL streaming time: {time.time() - start_time:.4f} seconds ({rows_seen} rows)")
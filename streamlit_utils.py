@@ -3,6 +3,9 @@ from utils import walkthrough,sample_questions,intro_to_data,banner
 import time
 import yaml
 from feedback_store import store_feedback, get_similar_question_answer
+from core.registry import registry
+import answer_cache
+from query_engine.local_ann import normalize_question
 import logging
 import uuid
 import time
@@ -14,6 +17,9 @@ logger = logging.getLogger(__name__)
 with open('conf_telchurn.yml', 'r') as f:
     model_config = yaml.load(f, Loader=yaml.FullLoader)
 
+answer_cache_settings = answer_cache.llm_config.get('answer_cache', {})
+answer_cache_enabled = answer_cache_settings.get('enabled', False)
+
 # Function to map roles to Streamlit roles
 def role_to_streamlit(role):
     return "assistant" if role == "model" else role
@@ -111,62 +117,84 @@ def handle_user_input(prompt):
     # Display user's message
     st.chat_message("user").markdown(prompt)
 
-    # Check for similar questions first
-    similar_questions = get_similar_question_answer(prompt, k=1)
-    print(f"Debug - Similar questions: {similar_questions}")
-    
-    if similar_questions:
-        similar_question = similar_questions[0]
-        distance = similar_question['distance']
-        feedback_score = similar_question.get('feedback', 'N/A')
-        
-        # Check for exact match by comparing strings
-        if prompt.lower().strip() == similar_question['question'].lower().strip():
-            st.info(f"This exact question was found in our vector DB with a feedback score of {feedback_score}. Here's the answer:")
-            display_answer(prompt, similar_question['answer'], is_similar=True)
-        elif distance < 0.16:  # Similar question (adjust threshold as needed)
-            st.info(f"A similar question was found in our vector DB with a feedback score of {feedback_score}. Here's the answer:")
-            display_answer(prompt, similar_question['answer'], is_similar=True)
-            st.warning("""If this answer doesn't address your question, please use the reword the question to get a new response from agent.
-                       Current answer is from a previous answer to similar question""")
-            
-            # # Use a button to trigger agent response
-            # if st.button("Use Agent"):
-            #     generate_new_response(prompt)
-        else:
-            generate_new_response(prompt)
+    # Earlier answers to the same question are served without running the agent
+    tier, entry = lookup_previous_answer(prompt)
+    print(f"Debug - Answer cache: {tier} {entry}")
+
+    if tier == answer_cache.SERVE:
+        st.info("This question was answered recently. Here's the answer:")
+        display_answer(prompt, entry['answer'], cached_question=entry['question'], stream=False)
+    elif tier == answer_cache.WARN:
+        st.info("A similar question was answered recently. Here's the answer:")
+        display_answer(prompt, entry['answer'], cached_question=entry['question'], stream=False)
+        st.warning("""If this answer doesn't address your question, please use the reword the question to get a new response from agent.
+                   Current answer is from a previous answer to similar question""")
     else:
         generate_new_response(prompt)
 
+def lookup_previous_answer(prompt):
+    """
+    Returns (tier, entry) for an earlier answer to reuse: from the answer cache when
+    it is enabled, otherwise from the positively rated answers in the feedback store.
+    """
+    if answer_cache_enabled:
+        # Versioned by model and data summary
+        return registry.get('answer_cache').lookup(prompt)
+
+    similar_questions = get_similar_question_answer(prompt, k=1)
+    if not similar_questions:
+        return answer_cache.PASS, None
+    similar_question = similar_questions[0]
+    entry = {"question": similar_question['question'], "answer": similar_question['answer'],
+             "distance": similar_question['distance']}
+    if normalize_question(prompt) == normalize_question(similar_question['question']):
+        return answer_cache.SERVE, entry
+    if (similar_question['distance'] < answer_cache_settings.get('warn_distance', 0.16)
+            and answer_cache.same_literals(prompt, similar_question['question'])):
+        return answer_cache.WARN, entry
+    return answer_cache.PASS, None
+
 def generate_new_response(prompt):
     with st.spinner("Processing with AI agent..."):
         # Send user entry to Gemini and get the response
+        tool_failures = st.session_state.get('tool_failures', 0)
         response = st.session_state.chat.send_message(prompt)
-        answer = response.candidates[0].content.parts[0].text
-    
-    display_answer(prompt, answer)
+        candidate = response.candidates[0]
+        answer = candidate.content.parts[0].text
 
-def display_answer(prompt, answer, is_similar=False):
+    if answer_cache_enabled:
+        # Incomplete answers and answers built on a failed tool call (toolbox.tool_error) are not cached
+        registry.get('answer_cache').store_answer(
+            prompt, answer, finish_reason=candidate.finish_reason,
+            tool_failed=st.session_state.get('tool_failures', 0) > tool_failures)
+    display_answer(prompt, answer, cached_question=prompt)
+
+def display_answer(prompt, answer, cached_question=None, stream=True):
     response_container = st.chat_message("assistant")
     response_placeholder = response_container.empty()
     response_text = ""
     print(f"Debug - Displaying answer: {answer[:100]}...")  # Print first 100 chars of answer
 
-    # Simulate streaming each character
-    for char in answer:
-        response_text += char
-        response_placeholder.markdown(response_text)
-        time.sleep(0.005)  # Simulate streaming delay for demonstration purposes
+    if stream:
+        # Simulate streaming each character
+        for char in answer:
+            response_text += char
+            response_placeholder.markdown(response_text)
+            time.sleep(0.005)  # Simulate streaming delay for demonstration purposes
+    else:
+        # Cached answers are shown at once; the simulated typing would cost seconds on long answers
+        response_placeholder.markdown(answer)
 
-    # Only add feedback buttons for new responses
-    if not is_similar:
-        add_feedback_buttons(prompt, answer)
+    add_feedback_buttons(prompt, answer, cached_question)
 
-def add_feedback_buttons(question, answer):
+def add_feedback_buttons(question, answer, cached_question=None):
     qa_key = str(uuid.uuid4())
 
     def on_feedback_click(feedback_value):
         logger.info(f"Feedback button clicked: {feedback_value}")
+        if feedback_value < 0 and cached_question and answer_cache_enabled:
+            # A bad answer must not be served again
+            registry.get('answer_cache').invalidate(cached_question)
         if store_feedback(question, answer, feedback_value):
             st.success("Thank you for your feedback!")
             logger.info(f"Feedback stored successfully: {feedback_value}")
@@ -38,6 +38,7 @@ import os
 from agent import sqlagents
 from google.generativeai import configure
 from query_engine.sqlknowledgebase import VectorDBCreator
+from core.registry import registry
 
 
 
@@ -61,16 +62,54 @@ with open('conf_telchurn.yml', 'r') as f:
 Agent = sqlagents.Agent
 #embedder = sqlagents.EmbedderAgent('vertex')
 #QueryRefiller=sqlagents.QueryRefiller('gemini-1.5-flash-001')
-QueryRefiller = sqlagents.QueryRefiller('gemini-1.5-flash-001', GOOGLE_API_KEY)
-chat2sql = TiDBChat2SQL()
-vector_db = VectorDBCreator()
+chat2sql_parallel_jobs = model_config.get('query_engine', {}).get('chat2sql_parallel_jobs', 1)
+query_guards = model_config.get('query_engine', {}).get('query_guard', {})
+score_chunk_size = model_config.get('query_engine', {}).get('score_chunk_size', 50000)
+max_scenario_rows = model_config.get('query_engine', {}).get('max_scenario_rows', 2000000)
 
+# Heavy clients are built once per process, on first use, by the shared registry
+registry.register('chat2sql', TiDBChat2SQL, health_check=lambda client: client.ping(), close=lambda client: client.close())
+registry.register('vector_db', VectorDBCreator, health_check=lambda db: db.vector_store is not None)
+registry.register('query_refiller', lambda: sqlagents.QueryRefiller('gemini-1.5-flash-001', GOOGLE_API_KEY))
+registry.register('task_master', taskscheduler.TaskMaster)
+registry.register('churn_explainer', oracle.ShapOracle)
+registry.register('xgb_scorer', ModelScorer)
+registry.register('visualize_agent', VisualizeAgent.VisualizeAgent)
 
+# Tools resolve their clients once per call with registry.get, so a call keeps one instance
+# even if a health check swaps in a new one meanwhile; the proxies serve everything else
+QueryRefiller = registry.proxy('query_refiller')
+chat2sql = registry.proxy('chat2sql')
+vector_db = registry.proxy('vector_db')
 
-task_master = taskscheduler.TaskMaster()
-churn_explainer = oracle.ShapOracle()
-xgb_scorer = ModelScorer()
-visualize_agent = VisualizeAgent.VisualizeAgent()
+
+def tool_error(message):
+    """Returns a tool's error message to the agent and counts the failure, so an answer built on it is not cached."""
+    st.session_state.tool_failures = st.session_state.get('tool_failures', 0) + 1
+    return message
+
+
+def query_guard(tool):
+    """Returns the pre-execution cost guard configured for a tool, or None if it has none."""
+    guard = query_guards.get(tool)
+    return {**guard, 'tool': tool} if guard else None
+
+
+def stream_scored(sql, tool, **score_options):
+    """Guards `sql`, then streams its result through the model chunk by chunk."""
+    chat2sql, xgb_scorer = registry.get('chat2sql'), registry.get('xgb_scorer')
+    guard = query_guard(tool)
+    if guard:
+        sql, _ = chat2sql.guard_query(sql, guard)
+    chunks = chat2sql.execute_sql_stream(sql, chunk_size=score_chunk_size, columnar=True)
+    return xgb_scorer.score_stream(chunks, **score_options).run()
+
+
+
+task_master = registry.proxy('task_master')
+churn_explainer = registry.proxy('churn_explainer')
+xgb_scorer = registry.proxy('xgb_scorer')
+visualize_agent = registry.proxy('visualize_agent')
 
 
 with open(model_config['model']['shap_base_value'], "r") as file:
@@ -110,7 +149,6 @@ with open(model_config['model']['shap_base_value'], "r") as file:
 #     return generated_sql
 
 
-from query_engine.sqlknowledgebase import vector_db
 import streamlit as st
 
 def generate_sql(user_question: str):
@@ -127,13 +165,19 @@ def generate_sql(user_question: str):
         str
             the result sql query generated
     """
+    chat2sql, vector_db = registry.get('chat2sql'), registry.get('vector_db')
     
     st.markdown("--------------------------------------📥 *Generating Query* 📥--------------------------------------")
     normalized_question = normalize_string(user_question)
     print(f"Original question: {user_question}")
 
-    # Check for exact match or similar questions in vector store
-    result, is_exact_match = vector_db.find_similar_questions(user_question)
+    # Repeats of earlier questions, also with other ids or values, need no retrieval or generation
+    cached_sql = chat2sql.cached_sql(user_question)
+    if cached_sql:
+        result, is_exact_match = cached_sql, True
+    else:
+        # Check for exact match or similar questions in vector store
+        result, is_exact_match = vector_db.find_similar_questions(user_question)
 
     if is_exact_match:
         generated_sql = result
@@ -142,8 +186,9 @@ def generate_sql(user_question: str):
         # If no exact match, use similar questions to enhance the chat2sql prompt
         similar_queries = result[:3]  # Get top 3 similar queries
         
-        # Filter queries with similarity score less than 0.2
-        filtered_queries = [(question, sql, similarity) for question, sql, similarity in similar_queries if similarity < 0.2]
+        # Filter queries with similarity score less than 0.2 (cosine distance); decisive lexical matches carry None
+        filtered_queries = [(question, sql, similarity) for question, sql, similarity in similar_queries
+                            if similarity is None or similarity < 0.2]
         ##Pass only similar sql queries
         #filtered_queries = [(sql, similarity) for sql, similarity in similar_queries if similarity < 0.2]
 
@@ -158,11 +203,11 @@ def generate_sql(user_question: str):
             enhanced_prompt += "\nGenerate appropriate SQL to answer the User Query. Use similar SQL queries above for reference."
             print(f"Enhanced prompt: {enhanced_prompt}")
 
-            generated_sql = chat2sql.chat2sql(enhanced_prompt)
+            generated_sql = chat2sql.chat2sql(enhanced_prompt, parallel=chat2sql_parallel_jobs, cache_key=user_question)
             print(f"Generated SQL using enhanced prompt: {generated_sql}")
         else:
             print("No similar questions with similarity less than 0.2 found. Generating SQL without examples.")
-            generated_sql = chat2sql.chat2sql(user_question)
+            generated_sql = chat2sql.chat2sql(user_question, parallel=chat2sql_parallel_jobs)
             print(f"Generated SQL: {generated_sql}")
 
     # Save result
@@ -202,6 +247,7 @@ def execute_sql(user_question: str, sql_generated: str, output_mode: str = 'json
         The result of the SQL query. If output_mode is 'json', the result is a dictionary. If output_mode is 'table', 
         the result is a string formatted as a markdown table.
     """
+    chat2sql = registry.get('chat2sql')
     st.markdown("--------------------------------------⚙️ *Executing Query* ⚙️--------------------------------------")
 
     try:
@@ -209,7 +255,7 @@ def execute_sql(user_question: str, sql_generated: str, output_mode: str = 'json
         normalized_question = normalize_string(user_question)
         sql_generated=clean_sql(sql_generated)
         sql_generated = sql_generated.replace("\n", " ").replace("\\", "")
-        bq_df = chat2sql.execute_sql(sql_generated)
+        bq_df = chat2sql.execute_sql(sql_generated, guard=query_guard('execute_sql'))
         if output_mode == 'json':
             response = bq_df.to_json(orient='records')
         else:
@@ -222,6 +268,8 @@ def execute_sql(user_question: str, sql_generated: str, output_mode: str = 'json
             else:
                 response = f"""Explain to the user that the answer to their question is displayed as a table above.
                             Data is too large to create a textual summary though. If user needs more insights, please ask for more specific question."""
+        if bq_df.attrs.get('guard_note'):
+            response += "\n\n" + bq_df.attrs['guard_note']
             
         # Save intermediate result
         if normalized_question not in st.session_state.intermediate_results:
@@ -232,7 +280,7 @@ def execute_sql(user_question: str, sql_generated: str, output_mode: str = 'json
             "result": bq_df
         })
     except Exception as e:
-        return str(e)
+        return tool_error(str(e))
 
 
     return response
@@ -273,13 +321,11 @@ def subset_churn_contribution_analysis(user_question: str, sql_generated: str):
 
     try:
         sql_generated = remove_sql_and_backticks(sql_generated).replace("\n", " ").replace("\\", "")
-        df =chat2sql.execute_sql(sql_generated)
-        df = df.reset_index(drop=True)
-        df2 = xgb_scorer.model_predictor(df.copy())
-        response = f"The average churn prediction after the treatment changed from {round(100 * df2['prediction'].mean(), 2)}% to {round(100 * df2['new_prediction'].mean())}%."
+        totals = stream_scored(sql_generated, 'subset_churn_contribution_analysis')
+        response = f"The average churn prediction after the treatment changed from {round(100 * totals.mean('prediction'), 2)}% to {round(100 * totals.mean('new_prediction'))}%."
         return response
     except Exception as e:
-        return str(e)
+        return tool_error(str(e))
 
 def subset_clv_analysis(user_question:str, sql_generated:str,treatment_cost:float=0.0):
 
@@ -320,20 +366,20 @@ def subset_clv_analysis(user_question:str, sql_generated:str,treatment_cost:floa
         sql_generated=sql_generated.replace("\n", " ")
         sql_generated=sql_generated.replace("\\", "")
 
-        ##Get the subset data from bigquery
-        df = chat2sql.execute_sql(sql_generated)
-        df=df.reset_index(drop=True)
-        df['current_revenue']=df['monthlyrevenue']*12
-        #df['current_clv']=(df['monthlyrevenue']*12*df['prediction'])/(1+0.09-df['prediction'])
-        df['current_clv'] = (df['monthlyrevenue'] * 12 * (1 - df['prediction'])) / (0.09 + df['prediction'])
-
-        #print(df.shape)
-        ##Get the model prediction on this data
-        df2=xgb_scorer.model_predictor(df)
-        #print(df.shape)
-
-        df2['treatment_clv']=((df['monthlyrevenue']*12-treatment_cost)*(1-df['new_prediction']))/(0.09+df['new_prediction'])
-        
+        def add_current_clv(df):
+            df['current_clv'] = (df['monthlyrevenue'] * 12 * (1 - df['prediction'])) / (0.09 + df['prediction'])
+
+        def add_treatment_clv(df):
+            # monthlyrevenue holds the treated value once the model has replaced the columns
+            df['treatment_clv'] = ((df['monthlyrevenue'] * 12 - treatment_cost) * (1 - df['new_prediction'])) / (0.09 + df['new_prediction'])
+
+        ##Score the subset chunk by chunk, keeping only running totals
+        totals = stream_scored(sql_generated, 'subset_clv_analysis',
+                               aggregate_columns=['prediction', 'new_prediction', 'current_clv', 'treatment_clv'],
+                               before=add_current_clv, after=add_treatment_clv)
+        current_clv = totals.mean('current_clv')
+        treatment_clv = totals.mean('treatment_clv')
+
         response = (
             "CLV Impact Analysis Report:\n"
             "I have used the Discounted Cash Flow method to calculate the Customer Lifetime Value (CLV) for 1 year for the customers in the subset.\n\n"
@@ -353,19 +399,91 @@ def subset_clv_analysis(user_question:str, sql_generated:str,treatment_cost:floa
             "You can use this information to understand the impact of the treatment on the subset of customers and make informed decisions with more detailed analysis."
         ).format(
             treatment_cost,
-            round(df2['current_clv'].mean(), 2),
-            round(df2['treatment_clv'].mean(), 2),
-            round(100 * df2['prediction'].mean(), 2),
-            round(100 * df2['new_prediction'].mean(), 2),
-            round(df2['treatment_clv'].mean() - df2['current_clv'].mean(), 2),
-            df2.shape[0],
-            round(((round(df2['treatment_clv'].mean() - df2['current_clv'].mean(), 2)) * df2.shape[0]), 2)
+            round(current_clv, 2),
+            round(treatment_clv, 2),
+            round(100 * totals.mean('prediction'), 2),
+            round(100 * totals.mean('new_prediction'), 2),
+            round(treatment_clv - current_clv, 2),
+            totals.rows,
+            round(((round(treatment_clv - current_clv, 2)) * totals.rows), 2)
         )
         print(response)
         #st.markdown(response)
         return response
     except Exception as e:
-        return str(e)
+        return tool_error(str(e))
+
+def what_if_scenarios(user_question: str, sql_generated: str, scenarios: str):
+    """
+    Compares several what-if scenarios on the same subset of customers in one pass.
+
+    This function executes the SQL passed once to retrieve a subset of customers, then scores every scenario
+    (plus the unchanged baseline) in a single batched model prediction and returns a comparison table with the
+    average churn prediction and the 1-year CLV of each scenario.
+    Use this function instead of calling subset_churn_contribution_analysis or subset_clv_analysis repeatedly
+    when the user wants to compare treatments or sweep a feature over several values. Some use cases would be:-
+        1. What if currentequipmentdays were 30, 60, 90 or 120 for the high-risk customers?
+        2. Compare a 5% and a 10% discount on monthlyrevenue, with a treatment cost of $5 per customer
+    In order to use this tool generate_sql tool must be ran first and sql query should be generated.
+    The SQL should select the subset WITHOUT any treatment applied; treatments are given in scenarios.
+
+    Parameters
+    ----------
+    user_question : str
+        The user's question that the SQL query is intended to answer.
+    sql_generated : str
+        The SQL query returning the subset of customers. USE Select * always.
+    scenarios : str
+        A JSON list of scenarios. Each scenario is an object with an optional "name" and any of:
+            - "set": {"feature": value}          sets a feature to a value (numeric or category)
+            - "scale": {"feature": factor}       multiplies a numeric feature, e.g. 0.9 for a 10% decrease
+            - "add": {"feature": amount}         adds an amount to a numeric feature
+            - "treatment_cost": cost             cost of the treatment per customer, default 0
+            - "grid": {"feature": [v1, v2, ...]} one scenario per value of a single feature
+            - "range": {"feature": [start, stop, step]}  one scenario per value from start to stop
+        Example: [{"grid": {"currentequipmentdays": [30, 60, 90]}},
+                  {"name": "10% discount", "scale": {"monthlyrevenue": 0.9}, "treatment_cost": 5}]
+
+    Returns
+    -------
+    str
+        A report with one row per scenario comparing churn and CLV to the baseline.
+
+    Notes
+    -----
+        - The output from this is the report. You have to display this report to the user as it is. DO NOT MODIFY THE OUTPUT.
+    """
+    chat2sql, xgb_scorer = registry.get('chat2sql'), registry.get('xgb_scorer')
+    st.markdown("--------------------------------------🧪 *What-If Scenario Tool* 🧪--------------------------------------")
+
+    try:
+        scenario_specs = json.loads(scenarios) if isinstance(scenarios, str) else scenarios
+        if isinstance(scenario_specs, dict):
+            scenario_specs = scenario_specs.get('scenarios', [scenario_specs])
+        scenario_count = len(xgb_scorer.expand_scenarios(scenario_specs)) + 1
+
+        sql_generated = remove_sql_and_backticks(sql_generated).replace("\n", " ").replace("\\", "")
+        df = chat2sql.execute_sql(sql_generated, columnar=True, guard=query_guard('what_if_scenarios'))
+        if df is None:
+            return "The SQL query could not be executed. Please regenerate the SQL and try again."
+        if len(df) * scenario_count > max_scenario_rows:
+            return (f"{scenario_count} scenarios over {len(df):,} customers is too much to score at once "
+                    f"(limit {max_scenario_rows:,} rows). Please narrow the subset or reduce the number of scenarios.")
+
+        table = xgb_scorer.score_scenarios(df.reset_index(drop=True), scenario_specs)
+        table.columns = ['Scenario', 'Customers', 'Avg churn (%)', 'Churn change (pp)', 'Avg CLV ($)',
+                         'CLV impact per customer ($)', 'Total CLV impact ($)']
+        response = (
+            "What-If Scenario Report:\n"
+            "Each scenario is applied to the same customers and compared to the baseline (no change). "
+            "CLV is the 1-year Discounted Cash Flow value with a 9% discount rate, net of the treatment cost.\n\n"
+            f"{tabulate.tabulate(table, headers='keys', tablefmt='pipe', showindex='never')}\n\n"
+            "Note that the above results are based on the model predictions and assumptions made."
+        )
+        print(response)
+        return response
+    except Exception as e:
+        return tool_error(str(e))
 
 def model_stat(user_question:str):
 
@@ -393,7 +511,7 @@ def model_stat(user_question:str):
         model_stats+=note
         return model_stats
     except Exception as e:
-        return str(e)
+        return tool_error(str(e))
 
 def generate_visualizations(user_question: str, generated_sql: str):
     """
@@ -410,21 +528,22 @@ def generate_visualizations(user_question: str, generated_sql: str):
     - Tuple containing HTML strings for embedding the visualizations.
     - Generates two charts with elements "chart-div" and "chart-div-1".
     """
+    chat2sql, visualize_agent = registry.get('chat2sql'), registry.get('visualize_agent')
 
     st.markdown("--------------------------------------📉 *Visualization Tool* 📉--------------------------------------")
 
     try:
         normalized_question = normalize_string(user_question)
         generated_sql = generated_sql.replace("\n", " ").replace("\\", "")
-        sql_results = chat2sql.execute_sql(generated_sql)
+        sql_results = chat2sql.execute_sql(generated_sql, guard=query_guard('generate_visualizations'))
         sql_results_json=sql_results.to_json(orient='records')
 
         ###Adding conditions to prevent full dataset going into visualization agent
         if sql_results.shape[0] == 0:
-            return f"Sorry. Unexpected error due to invalid sql query on data retrieval"
+            return tool_error("Sorry. Unexpected error due to invalid sql query on data retrieval")
         elif sql_results.shape[0] > 1000:
-            return f"""Sorry. Unexpected error due to large data size. Please try with a smaller subset of data.
-            If you find the query to be incorrect, please rephrase the question and try again."""
+            return tool_error(f"""Sorry. Unexpected error due to large data size. Please try with a smaller subset of data.
+            If you find the query to be incorrect, please rephrase the question and try again.""")
         else:
             # Generate unique element IDs
             chart_div_1_id = "chart_div_" + str(uuid.uuid4()).replace("-", "")
@@ -474,9 +593,9 @@ def generate_visualizations(user_question: str, generated_sql: str):
 
                 return chart_html_1
             else:
-                return f"Sorry. Unexpected error due to invalid sql query on data retrieval"
+                return tool_error("Sorry. Unexpected error due to invalid sql query on data retrieval")
     except Exception as e:
-        return str(e)
+        return tool_error(str(e))
 
 
 def question_reformer(user_question:str):
@@ -495,6 +614,7 @@ def question_reformer(user_question:str):
     str
         A string containing the reformulated user questions
     """
+    task_master = registry.get('task_master')
     st.markdown("--------------------------------------🔄 *Processing Input* 🔄--------------------------------------")
     try:
         reformed_question=task_master.ask_taskmaster(user_question)
@@ -502,7 +622,7 @@ def question_reformer(user_question:str):
         print(f"Reformed Question: {reformed_question}")
         return reformed_question
     except Exception as e:
-        return str(e)
+        return tool_error(str(e))
 
 def subset_shap_summary(customer_data_sql_query:str,shap_data_sql_query:str,user_question:str):
     """
@@ -537,6 +657,7 @@ def subset_shap_summary(customer_data_sql_query:str,shap_data_sql_query:str,user
         - The output from this is the report. You have to display this report to the user as it is. DO NOT MODIFY THE OUTPUT.
         - Add a final note after the report of how nd why the recommended actions should be tested with churn adn clv impact analysis.
 """
+    QueryRefiller, chat2sql, churn_explainer = registry.get('query_refiller'), registry.get('chat2sql'), registry.get('churn_explainer')
     st.markdown("--------------------------------------🔍 *Subset Churn Analysis Tool* 🔍--------------------------------------")
 
     try:
@@ -554,8 +675,8 @@ def subset_shap_summary(customer_data_sql_query:str,shap_data_sql_query:str,user
 
 
         ##Get the subset data from bigquery
-        df_data=chat2sql.execute_sql(customer_data_sql_query_updated)
-        df_shap_data=chat2sql.execute_sql(shap_data_sql_query_updated)
+        df_data=chat2sql.execute_sql(customer_data_sql_query_updated, columnar=True, guard=query_guard('subset_shap_summary'))
+        df_shap_data=chat2sql.execute_sql(shap_data_sql_query_updated, columnar=True, guard=query_guard('subset_shap_summary'))
 
         # Remove duplicated column names and keep the first one
         df_shap_data = df_shap_data.loc[:, ~df_shap_data.columns.duplicated()]
@@ -694,7 +815,7 @@ def subset_shap_summary(customer_data_sql_query:str,shap_data_sql_query:str,user
 
         return report
     except Exception as e:
-        return str(e)
+        return tool_error(str(e))
 
 def customer_recommendations(user_question:str, customer_data_query:str,counterfatual_data_query:str):
     """
@@ -716,6 +837,7 @@ def customer_recommendations(user_question:str, customer_data_query:str,counterf
     str
         A report on recommended actions to reduce the customer churn. You have to display this report to the user.
     """
+    chat2sql, churn_explainer = registry.get('chat2sql'), registry.get('churn_explainer')
     st.markdown("--------------------------------------💬 *Customer Recommendations Tool* 💬--------------------------------------")
 
     try:
@@ -727,8 +849,8 @@ def customer_recommendations(user_question:str, customer_data_query:str,counterf
         counterfatual_data_query=counterfatual_data_query.replace("\\", "")
 
         ##Get the subset data from bigquery
-        counterfactuals = chat2sql.execute_sql(counterfatual_data_query)
-        customer_data = chat2sql.execute_sql(customer_data_query)
+        counterfactuals = chat2sql.execute_sql(counterfatual_data_query, guard=query_guard('customer_recommendations'))
+        customer_data = chat2sql.execute_sql(customer_data_query, guard=query_guard('customer_recommendations'))
 
         shap_columns = [col for col in customer_data.columns if col.startswith('shapvalue_')]
         ##Drop all shap columns
@@ -754,4 +876,4 @@ def customer_recommendations(user_question:str, customer_data_query:str,counterf
         return response
     except Exception as e:
         print(4)
-        return str(e)
+        return tool_error(str(e))